@@ -3,8 +3,10 @@ import __main__
 
 from flask import Flask
 
+from app.ext.capture import RequestCapture
 from app.ext.database import Database, init_database
-from app.ext.redis import init_redis
+from app.ext.redis import init_redis, check_redis, reset_redis
+from app.ext.startup import StartupJobRegistry
 from scripts.utils import get_project_root
 from scripts.utils import load_file
 
@@ -16,25 +18,72 @@ config_path = os.path.join(get_project_root(), "settings.json")
 config_data = load_file(config_path)
 app.config.update(config_data)
 
-# # 初始化数据库
-# app.config["database"] = Database(app.config["mysql"])
-# # 初始化redis
-# app.config["redis_client"] = init_redis(app.config.get("redis"))
+# 初始化数据库和redis客户端
+# 两者的连接池都在每个进程首次使用时才建立连接，导入时不会打开socket
+app.config["database"] = Database(app.config["mysql"])
+app.config["redis_client"] = init_redis(app.config.get("redis"), check=False)
+# 请求采样记录，未启用时不产生开销
+app.config["request_capture"] = RequestCapture(app.config.get("capture"))
+
+
+def reset_connection_pools():
+    """
+    丢弃从父进程继承的数据库/redis连接
+
+    在fork出的子进程(celery prefork、gunicorn worker等)中调用
+    """
+    if app.config.get("database"):
+        app.config["database"].reset_pool()
+    if app.config.get("redis_client"):
+        reset_redis(app.config["redis_client"])
+
+
+# 任何方式fork出的子进程都会重建连接池
+os.register_at_fork(after_in_child=reset_connection_pools)
 
 
 def init_app(app):
+    """开发服务器使用：注册蓝图并在当前进程中执行一次性初始化"""
+    # 先注册蓝图，初始化任务在后台执行，不影响接收事件
+    register_blueprints(app)
+    run_startup_jobs(app)
+
+
+def create_app():
+    """
+    WSGI 应用工厂，供 gunicorn 等多进程服务器的每个worker调用
+
+    只注册蓝图，不执行一次性初始化；
+    一次性初始化由`run_startup_jobs`完成(gunicorn下在worker启动后执行，参考gunicorn.conf.py)
+    """
+    register_blueprints(app)
+    return app
+
+
+def run_startup_jobs(app):
+    """
+    一次性初始化，每次部署只需执行一次
+
+    可以在多个进程中同时调用(如gunicorn的每个worker)：
+    数据库初始化只由一个进程执行，其他进程等待其完成；飞书初始化任务在后台线程中执行，同样只由一个进程执行
+    """
     # 初始化第三方组件
     init_third_party(app.config)
     # 初始化子模块
     init_submodules(app)
-    # 注册蓝图
-    register_blueprints(app)
 
 
 # 初始化第三方组件
 def init_third_party(config):
+    if config.get("redis_client"):
+        check_redis(config["redis_client"])
     if config.get("database"):
-        init_database(config["database"])
+        # 同一次部署中只初始化一次表和触发器，其他进程等待初始化完成后再处理请求
+        registry = StartupJobRegistry(config.get("redis_client"),
+                                      {**(config.get("startup") or {}), "wait_for_leader": True})
+        result = registry.run({"init_database": lambda: init_database(config["database"])})
+        if result["init_database"] not in ("done", "skipped"):
+            raise RuntimeError(f"数据库初始化失败: {result['init_database']}")
 
 # 初始化子模块
 def init_submodules(app):
@@ -44,10 +93,17 @@ def init_submodules(app):
 
 
 def register_blueprints(app):
-    from app.feishu import feishu_bp
+    # 防止同一进程内重复注册
+    if "feishu" in app.blueprints:
+        return
+    from app.feishu import feishu_bp, register_feishu_blueprints
     from app.web import web_bp
-    from app.api import api_bp
+    from app.api import api_bp, init_api
+    from app.health import health_bp
 
+    register_feishu_blueprints()
+    init_api()
     app.register_blueprint(feishu_bp)
     app.register_blueprint(web_bp)
     app.register_blueprint(api_bp)
+    app.register_blueprint(health_bp)
@@ -4,4 +4,6 @@ api_bp = Blueprint("api", __name__, url_prefix="/api")
 
 def init_api():
     from .items import items_bp
-    api_bp.register_blueprint(items_bp)
\ No newline at end of file
+    from .captures import captures_bp
+    api_bp.register_blueprint(items_bp)
+    api_bp.register_blueprint(captures_bp)
\ No newline at end of file
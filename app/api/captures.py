@@ -0,0 +1,32 @@
+import hmac
+
+from flask import abort
+from flask import Blueprint
+from flask import jsonify
+from flask import request
+
+from app import app
+
+captures_bp = Blueprint('api_captures_bp', __name__)
+request_capture = app.config.get("request_capture")
+
+
+@captures_bp.route("/captures", methods=["GET"])
+def captures():
+    """
+    查看当前进程最近记录的请求，参考`RequestCapture`
+
+    需要在请求头`X-Capture-Token`中携带settings.json中的capture.token，未配置token时该接口不可用
+    可选参数: limit(默认20) source(只返回该来源的记录)
+    """
+    if not request_capture.token:
+        abort(404)
+    token = request.headers.get("X-Capture-Token", "")
+    if not hmac.compare_digest(token, request_capture.token):
+        abort(403)
+    limit = request.args.get("limit", 20, type=int)
+    source = request.args.get("source")
+    return jsonify({
+        "stats": request_capture.get_stats(),
+        "records": request_capture.get_recent(limit, source),
+    })
@@ -1,3 +1,4 @@
+import hmac
 import logging
 import ujson
 from datetime import datetime
@@ -5,15 +6,29 @@ from flask import abort
 from flask import Blueprint
 from flask import jsonify
 from flask import request
-from scripts.utils import DEBUG_OUT
+from app import app
 
 items_bp = Blueprint('api_items_bp', __name__)
+request_capture = app.config.get("request_capture")
+database = app.config["database"]
+API_TOKEN = (app.config.get("api") or {}).get("token")
+
+
+@items_bp.before_request
+def check_token():
+    """
+    需要在请求头`X-API-Token`中携带settings.json中的api.token，未配置token时接口不可用
+    """
+    if not API_TOKEN:
+        abort(404)
+    token = request.headers.get("X-API-Token", "")
+    if not hmac.compare_digest(token, API_TOKEN):
+        abort(403)
 
 @items_bp.route("/fetch", methods=["GET"])
 def fetch():
     oid = request.args.get("oid")
     try:
-        from app import database
         result = database.get_item(int(oid))
         return jsonify(result)
     except ValueError:
@@ -21,15 +36,14 @@ def fetch():
         
 @items_bp.route("/operate", methods=["POST"])
 def operate():
-    DEBUG_OUT(data = request.json)
+    request_capture.capture("api.items.operate", request.json)
     object = request.json.get("object")
     operation = request.json.get("operation")
     operator = request.json.get("operatorName")
     purpose = request.json.get("purpose")
     msg = request.json.get("msg")
     try:
-        from app import database
-        operator_user_id = database.get_member(user_name=operator).get('user_id') 
+        operator_user_id = database.get_member(user_name=operator).get('user_id')
         if operation == 'apply':
             error_message = None
             item_info = database.get_item(int(object['oid']))
@@ -47,9 +61,8 @@ def operate():
             return jsonify(result)
         elif operation == 'report':
             msg = f"{operator} 报告物品 {object} 存在问题： {msg}"
-            from app.feishu.config import message_api_client
-            # from app.feishu.config import ADMIN_USER_ID
-            # message_api_client.send_text_with_user_id(ADMIN_USER_ID[0],msg)
+            from app.feishu.notify import notify_admins
+            notify_admins(msg)
             return jsonify()
     except ValueError as e:
         return abort(500, description=f"Error: {e}")
\ No newline at end of file
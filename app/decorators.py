@@ -1,28 +1,45 @@
+import threading
 from time import time
 from functools import wraps
 from flask import request, jsonify
 from app import app
-from app.ext.celery import is_celery_running, celery
+from app.ext.celery import is_celery_running, celery, get_task_options
 
 # 限制请求频率
 REQUEST_LIMIT = 1  # 限制的请求次数
 TIME_WINDOW = 3  # 时间窗口，单位为秒
 
-def celery_task(func):
+def celery_task(func=None, *, queue=None, priority=None, ignore_result=None, countdown=None, background=False):
     """
     装饰器：如果 Celery 服务运行，则将函数作为 Celery 任务。
     否则，直接同步调用函数。
+
+    可通过参数指定任务队列，例如 `@celery_task(queue="bulk", ignore_result=True)`
+        queue: 任务队列名,参考`app.ext.celery.QUEUE_CONFIG`,默认为 interactive
+        priority: 任务优先级,默认使用队列配置中的优先级
+        ignore_result: 是否不向 result backend 写入任务结果
+        countdown: 延迟执行的秒数，同步执行时忽略
+        background: Celery 服务未运行时在后台线程中执行，不阻塞调用者
     """
+    if func is None:
+        return lambda f: celery_task(f, queue=queue, priority=priority, ignore_result=ignore_result,
+                                     countdown=countdown, background=background)
     # 使用 Celery 的 task 装饰器来装饰函数
-    task = celery.task(func)
+    task = celery.task(func, **get_task_options(queue, priority, ignore_result))
     @wraps(func)
     def wrapper(*args, **kwargs):
         if is_celery_running():
             # 通过 Celery 异步执行
-            return task.apply_async(args=args, kwargs=kwargs)
+            return task.apply_async(args=args, kwargs=kwargs, countdown=countdown)
+        elif background:
+            thread = threading.Thread(target=func, args=args, kwargs=kwargs,
+                                      name=f"task-{func.__name__}", daemon=True)
+            thread.start()
+            return thread
         else:
             # 同步直接执行函数
             return func(*args, **kwargs)
+    wrapper.task = task
     return wrapper
 
 def rate_limit(event_type):
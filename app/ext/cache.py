@@ -0,0 +1,72 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    """
+    按数据版本整体失效的进程内LRU缓存
+
+    版本号存储在redis的 `cache:<name>:version` 中，任一进程修改数据后调用`invalidate`递增版本号，
+    其他进程下次读取时版本号不同，旧条目不会再被命中，最终被LRU淘汰。
+    未配置redis时只在当前进程内失效。
+
+    缓存的对象会被多个请求共享，调用方不能修改取出的值。
+    """
+
+    def __init__(self, redis_client: redis.Redis | None, name: str, maxsize: int = 256):
+        self.redis_client = redis_client
+        self.name = name
+        self.maxsize = maxsize
+        self._version_key = f"cache:{name}:version"
+        self._local_version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def version(self) -> int:
+        """当前的数据版本"""
+        if not self.redis_client:
+            return self._local_version
+        version = self.redis_client.get(self._version_key)
+        return int(version) if version else 0
+
+    def get_or_create(self, key, factory):
+        """
+        获取key对应的缓存，不存在时调用factory()生成并缓存
+
+        factory抛出异常时不缓存
+        """
+        full_key = (key, self.version)
+        with self._lock:
+            if full_key in self._entries:
+                self._entries.move_to_end(full_key)
+                self._stats["hits"] += 1
+                return self._entries[full_key]
+            self._stats["misses"] += 1
+        value = factory()
+        with self._lock:
+            self._entries[full_key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        """递增数据版本，使所有进程中的缓存失效"""
+        if self.redis_client:
+            self.redis_client.incr(self._version_key)
+        else:
+            self._local_version += 1
+        with self._lock:
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    def get_stats(self) -> dict:
+        """获取当前进程的缓存统计数据"""
+        with self._lock:
+            return {**self._stats, "size": len(self._entries), "maxsize": self.maxsize}
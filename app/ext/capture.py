@@ -0,0 +1,158 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+import ujson
+
+from scripts.utils import get_project_root
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPTURE_CONFIG = {
+    "enabled": False,
+    "sample_rate": 1.0,         # 采样率 0~1
+    "capacity": 200,            # 内存中保留最近的请求数
+    "file": ".logs/requests.ndjson",
+    "max_bytes": 10485760,      # 单个文件大小上限，超出后轮转
+    "backup_count": 5,          # 保留的历史文件数
+    "flush_interval": 1.0,      # 后台写入文件的间隔(秒)
+    "token": "",                # 查看接口的访问令牌，为空时关闭查看接口
+}
+
+
+class RequestCapture:
+    """
+    采样记录请求数据，用于替代`DEBUG_OUT`
+
+    被采样的请求只放入内存中的环形缓冲区，由后台线程定期序列化并追加到NDJSON文件(按大小轮转)，
+    不会阻塞请求处理。未启用时`capture`只做一次属性判断。
+
+    记录的是请求数据的引用，调用方在记录后不能修改该数据。
+    """
+
+    def __init__(self, capture_config: dict | None = None):
+        config = {**DEFAULT_CAPTURE_CONFIG, **(capture_config or {})}
+        self.enabled = bool(config["enabled"])
+        self.sample_rate = float(config["sample_rate"])
+        self.capacity = int(config["capacity"])
+        self.flush_interval = float(config["flush_interval"])
+        self.token = config["token"]
+        self.file = config["file"]
+        if not os.path.isabs(self.file):
+            self.file = os.path.join(get_project_root(), self.file)
+        self.max_bytes = int(config["max_bytes"])
+        self.backup_count = int(config["backup_count"])
+
+        self._ring = deque(maxlen=self.capacity)
+        self._pending = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self._handler = None
+        self._writer = None
+        self._writer_pid = None
+        self._stats = {"captured": 0, "sampled_out": 0, "dropped": 0, "written": 0}
+
+    def capture(self, source: str, data):
+        """
+        按采样率记录一次请求
+
+        Args:
+            source: 请求来源，如 `feishu.event`、`api.items.operate`
+            data: 请求数据(可被json序列化)
+        """
+        if not self.enabled:
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self._stats["sampled_out"] += 1
+            return
+        entry = (time.time(), source, data)
+        with self._lock:
+            self._ring.append(entry)
+            if len(self._pending) == self._pending.maxlen:
+                # 写入跟不上时丢弃最旧的记录，不阻塞请求
+                self._stats["dropped"] += 1
+            self._pending.append(entry)
+            self._stats["captured"] += 1
+        self._ensure_writer()
+
+    def get_recent(self, limit: int | None = None, source: str | None = None) -> list[dict]:
+        """获取内存中最近的记录，最新的在前"""
+        with self._lock:
+            entries = list(self._ring)
+        entries.reverse()
+        if source:
+            entries = [entry for entry in entries if entry[1] == source]
+        return [self._to_record(entry) for entry in entries[:limit]]
+
+    def get_stats(self) -> dict:
+        """获取当前进程的记录统计数据"""
+        with self._lock:
+            return {
+                **self._stats,
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "size": len(self._ring),
+                "pending": len(self._pending),
+                "capacity": self.capacity,
+                "pid": os.getpid(),
+            }
+
+    def flush(self):
+        """将待写入的记录写入文件"""
+        with self._lock:
+            entries = list(self._pending)
+            self._pending.clear()
+        if not entries:
+            return
+        handler = self._get_handler()
+        for entry in entries:
+            try:
+                line = ujson.dumps(self._to_record(entry), ensure_ascii=False)
+            except (TypeError, OverflowError, ValueError) as e:
+                line = ujson.dumps({**self._to_record(entry), "data": repr(entry[2]),
+                                    "error": str(e)}, ensure_ascii=False)
+            handler.emit(logging.makeLogRecord({"msg": line}))
+        handler.flush()
+        self._stats["written"] += len(entries)
+
+    @staticmethod
+    def _to_record(entry) -> dict:
+        timestamp, source, data = entry
+        return {"time": round(timestamp, 3), "source": source, "data": data}
+
+    def _get_handler(self) -> RotatingFileHandler:
+        if self._handler is None:
+            os.makedirs(os.path.dirname(self.file), exist_ok=True)
+            self._handler = RotatingFileHandler(
+                self.file,
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                encoding="utf-8",
+                delay=True,
+            )
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+        return self._handler
+
+    def _ensure_writer(self):
+        # fork出的子进程中不会继承后台线程，按pid判断是否需要重新启动
+        pid = os.getpid()
+        if self._writer_pid == pid and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer_pid == pid and self._writer.is_alive():
+                return
+            self._writer_pid = pid
+            self._handler = None
+            self._writer = threading.Thread(target=self._run_writer, name="request-capture", daemon=True)
+            self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("写入请求记录失败: %s", e)
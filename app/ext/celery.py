@@ -1,12 +1,37 @@
 import logging
 
 from celery import Celery
+from celery.signals import celeryd_init, setup_logging, worker_process_init
+from kombu import Queue
 from app import app
 
 logger = logging.getLogger(__name__)
 # 用于记录警告是否已显示
 logger_shown = False
 
+# 任务队列配置
+# interactive: 用户交互相关的短任务(更新消息卡片等)，token有效期短，需尽快执行
+# bulk:        管理员批量操作(/save /load 等)，耗时长，允许排队
+# media:       文件处理任务(gcode优化等)，占用CPU/带宽
+# priority 使用 redis broker 的语义：0 为最高优先级，9 为最低
+DEFAULT_QUEUE = "interactive"
+DEFAULT_QUEUE_CONFIG = {
+    "interactive": {"priority": 0, "concurrency": 4, "prefetch_multiplier": 4},
+    "bulk":        {"priority": 9, "concurrency": 1, "prefetch_multiplier": 1},
+    "media":       {"priority": 5, "concurrency": 1, "prefetch_multiplier": 1},
+}
+
+
+def load_queue_config(celery_config: dict | None) -> dict:
+    """合并settings.json中celery.queues的配置与默认配置"""
+    queues = {name: dict(conf) for name, conf in DEFAULT_QUEUE_CONFIG.items()}
+    for name, conf in ((celery_config or {}).get("queues") or {}).items():
+        queues.setdefault(name, {}).update(conf)
+    return queues
+
+
+QUEUE_CONFIG = load_queue_config(app.config.get("celery"))
+
 # 创建 Celery 实例，使用 Flask 配置
 
 def init_celery():
@@ -15,12 +40,76 @@ def init_celery():
     REDIS_DB = app.config.get("redis").get("db", 0)
     app.config["CELERY_BROKER_URL"] = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
     app.config["CELERY_RESULT_BACKEND"] = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
+    # 任务路由，由于需要和Flask配置混用，这里同样使用旧格式
+    app.config["CELERY_QUEUES"] = tuple(Queue(name, routing_key=name) for name in QUEUE_CONFIG)
+    app.config["CELERY_DEFAULT_QUEUE"] = DEFAULT_QUEUE
+    app.config["CELERY_DEFAULT_PRIORITY"] = QUEUE_CONFIG[DEFAULT_QUEUE]["priority"]
+    app.config["BROKER_TRANSPORT_OPTIONS"] = {
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    }
 init_celery()
-app.config['CELERY_INCLUDE'] = ['app.feishu.commands']  # 确保 include 使用旧格式
+app.config['CELERY_INCLUDE'] = [  # 确保 include 使用旧格式
+    'app.feishu.commands.application',
+    'app.feishu.commands.bitables',
+    'app.feishu.notify',
+]
 celery = Celery(app.import_name, broker=app.config.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')) # 不知道为什么必须手动指定 broker
 celery.conf.update(app.config)  # 更新 Celery 配置
 
 
+def get_task_options(queue: str | None = None, priority: int | None = None,
+                     ignore_result: bool | None = None) -> dict:
+    """生成注册celery任务时的路由参数"""
+    queue = queue or DEFAULT_QUEUE
+    if queue not in QUEUE_CONFIG:
+        raise ValueError(f"未知的任务队列 {queue}，可选 {list(QUEUE_CONFIG)}")
+    options = {
+        "queue": queue,
+        "priority": priority if priority is not None else QUEUE_CONFIG[queue]["priority"],
+    }
+    if ignore_result is not None:
+        options["ignore_result"] = ignore_result
+    return options
+
+
+@celeryd_init.connect
+def configure_worker_by_queue(sender=None, conf=None, options=None, **kwargs):
+    """
+    根据worker消费的队列设置并发数和预取数
+
+    仅在worker只消费单个队列,且启动命令中未指定 -c 时生效，
+    例如 `celery -A app.ext.celery worker -Q bulk` 会使用 bulk 队列的配置
+    """
+    queues = (options or {}).get("queues") or []
+    if isinstance(queues, str):
+        queues = queues.split(",")
+    if len(queues) != 1 or queues[0] not in QUEUE_CONFIG:
+        return
+    queue_config = QUEUE_CONFIG[queues[0]]
+    if not options.get("concurrency") and queue_config.get("concurrency"):
+        conf.worker_concurrency = queue_config["concurrency"]
+    if queue_config.get("prefetch_multiplier"):
+        conf.worker_prefetch_multiplier = queue_config["prefetch_multiplier"]
+    logger.info("worker %s 消费队列 %s, 并发数 %s" % (
+        sender, queues[0], conf.worker_concurrency))
+
+
+@setup_logging.connect
+def configure_logging(**kwargs):
+    """使用与Flask/gunicorn相同的日志配置，celery不再修改根日志"""
+    from app.ext.logger import init_logging
+    init_logging()
+
+
+@worker_process_init.connect
+def reset_pools_in_worker_process(**kwargs):
+    """prefork子进程启动时重建数据库/redis连接池"""
+    from app import reset_connection_pools
+    reset_connection_pools()
+
+
 def is_celery_running():
     """检查 Celery 服务是否运行"""
     celery_status = False
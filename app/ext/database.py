@@ -19,19 +19,30 @@ class Database(MySql) :
     }
 
     def __init__(self, config : dict):
-        """通过info数据初始化sql连接池"""
+        """
+        通过info数据初始化sql连接池
+
+        连接池在每个进程首次使用时创建，参数可通过config['pool']修改,
+        参考`scripts.api.mysql_connector.DEFAULT_POOL_CONFIG`
+        """
         host = config.get('host')
         port = config.get('port')
         user = config.get('user')
         password = config.get('password')
+        super().__init__(host, port, user, password, pool_config=config.get('pool'))
+        self.db = config.get('db')
+        super().set_default_db(self.db)
+
+    def check_connection(self):
+        """检查能否连接到mysql,无法连接时退出程序"""
         try:
-            super().__init__(host, port, user, password)
+            self._checkout().close()
         except Exception as e:
             # 获取异常类型
             exception_type = type(e).__name__
             # 获取异常的错误码和错误信息
-            error_code = e.args[0]  # 错误码
-            error_message = e.args[1]  # 错误信息
+            error_code = e.args[0] if len(e.args) > 0 else None  # 错误码
+            error_message = e.args[1] if len(e.args) > 1 else str(e)  # 错误信息
             # 打印或处理异常信息
             logger.error(
                 f"Create mysql connect error: \n\t"
@@ -40,8 +51,6 @@ class Database(MySql) :
                 f"Error Message: {error_message}"
             )
             sys.exit("创建Mysql连接错误，请检查配置")
-        self.db = config.get('db')
-        super().set_default_db(self.db)
 
     def get_categories(self) -> dict:
         """
@@ -158,6 +167,97 @@ class Database(MySql) :
             r['free'].append(it[4])
         return r
     
+    def get_list_page(
+        self,
+        category_id: int | None = None,
+        name: str | None = None,
+        after: int | None = None,
+        before: int | None = None,
+        limit: int = 20
+    ) -> dict[str, list]:
+        """
+        分页获取仓库内符合要求的物品信息(简略)
+
+        Args:
+            category_id: 物品类型id
+            name: 物品名,模糊搜索
+            after: 下一页，只返回id大于after的物品信息
+            before: 上一页，只返回id小于before的物品信息
+            limit: 每页数量
+
+        Return:
+            与`get_list`相同，额外包含
+                'has_more': 翻页方向上是否还有更多数据
+
+        raise:
+            ValueError: 缺少必要参数或无法根据条件找到物品信息时raise
+        """
+        if category_id:
+            info = super().fetch_page('item_list', 'father', int(category_id),
+                                      after=after, before=before, limit=limit + 1)
+            if not info:
+                raise ValueError(f"无法找到目标物品 category_id:{category_id}")
+        elif name:
+            info = super().fetch_page('item_list', 'name', name,
+                                      after=after, before=before, limit=limit + 1, like=True)
+            if not info:
+                raise ValueError(f"无法找到目标物品 name:{name}")
+        else:
+            raise ValueError(f"{__name__}.get_list_page 缺少必要的参数")
+
+        info, has_more = self._trim_page(info, limit, backward=after is None and before is not None)
+        r = {'id': [], 'father': [], 'name': [], 'total': [], 'free': [], 'has_more': has_more}
+        for it in info:
+            r['id'].append(it[0])
+            r['father'].append(it[1])
+            r['name'].append(it[2])
+            r['total'].append(it[3])
+            r['free'].append(it[4])
+        return r
+
+    def get_items_page(
+        self,
+        name_id: int,
+        after: int | None = None,
+        before: int | None = None,
+        limit: int = 20
+    ) -> dict[str, list] | None:
+        """
+        分页获取某物品名下的物品详细信息
+
+        Args:
+            name_id: 物品名id
+            after: 下一页，只返回oid大于after的物品
+            before: 上一页，只返回oid小于before的物品
+            limit: 每页数量
+
+        Return:
+            与`get_items`相同，额外包含
+                'has_more': 翻页方向上是否还有更多数据
+            没有物品时返回None
+
+        raise:
+            ValueError: 无法找到物品名时抛出
+        """
+        father = super().fetchone('item_list', 'id', name_id)
+        if not father:
+            raise ValueError(f"无法找到目标物品 name_id:{name_id}")
+        info = super().fetch_page('item_info', 'father', father[0],
+                                  after=after, before=before, limit=limit + 1)
+        if not info:
+            return None
+        info, has_more = self._trim_page(info, limit, backward=after is None and before is not None)
+        r = self._return_itemTable_by_info(info, name=father[2])
+        r['has_more'] = has_more
+        return r
+
+    @staticmethod
+    def _trim_page(info: list, limit: int, backward: bool = False) -> tuple[list, bool]:
+        """去掉为判断是否还有更多数据而多查询的一条"""
+        if len(info) <= limit:
+            return info, False
+        return (info[1:] if backward else info[:limit]), True
+
     def _return_itemTable_by_info(
         self, 
         info: list, 
@@ -346,7 +446,103 @@ class Database(MySql) :
             if not super().fetchone('members', 'user_id', user['user_id']):
                 super().insert('members', user)
 
-    def get_member(self, user_id: str | None = None, open_id:str | None = None) -> dict[str, list]:
+    def get_all_members(self) -> list[dict]:
+        """
+        获取所有用户的通讯录信息
+
+        Return:
+            [{'user_id', 'open_id', 'union_id', 'name'}]
+        """
+        members = super().getall('members') or []
+        return [
+            {'user_id': m[0], 'open_id': m[1], 'union_id': m[2], 'name': m[3]}
+            for m in members
+        ]
+
+    def sync_members(self, inserts: list[dict], updates: list[dict], deletes: list[str]) -> bool:
+        """
+        在一个事务中批量添加、更新、删除用户
+
+        用户改名时，同一事务中把其持有的物品(`item_info.wis`)改为新的用户名
+
+        Args:
+            inserts/updates: [{'user_id', 'open_id', 'union_id', 'name'}]
+            deletes: 删除的用户的user_id
+        """
+        try:
+            with super().transaction() as cursor:
+                renamed = self._rename_holders(cursor, updates)
+                self._execute_batch(cursor, 'members', 'user_id', inserts, updates, deletes)
+        except Exception as e:
+            logger.error(f"Error in sync_members: {str(e)}")
+            return False
+        if inserts or updates or deletes:
+            self._notify_write('members', *(['item_info'] if renamed else []))
+        return True
+
+    def upsert_member(self, member: dict) -> bool:
+        """
+        添加或更新单个用户，改名时同时更新其持有的物品，参考`sync_members`
+
+        Args:
+            member: {'user_id', 'open_id', 'union_id', 'name'}
+        """
+        try:
+            with super().transaction() as cursor:
+                cursor.execute("SELECT 1 FROM members WHERE user_id = %s", (member['user_id'],))
+                if cursor.fetchone():
+                    renamed = self._rename_holders(cursor, [member])
+                    self._execute_batch(cursor, 'members', 'user_id', updates=[member])
+                else:
+                    renamed = False
+                    self._execute_batch(cursor, 'members', 'user_id', inserts=[member])
+        except Exception as e:
+            logger.error(f"Error in upsert_member: {str(e)}")
+            return False
+        self._notify_write('members', *(['item_info'] if renamed else []))
+        return True
+
+    @staticmethod
+    def _rename_holders(cursor, members: list[dict]) -> bool:
+        """
+        物品的持有者以用户名记录在`item_info.wis`中，用户改名前将其持有的物品改为新的用户名
+
+        多个用户互换名字时同样正确(一条语句同时替换)
+
+        Return:
+            是否有用户改名
+        """
+        if not members:
+            return False
+        user_ids = [member['user_id'] for member in members]
+        cursor.execute(
+            f"SELECT user_id, name FROM members WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})",
+            tuple(user_ids))
+        old_names = {row[0]: row[1] for row in cursor.fetchall()}
+        renames = {
+            old_names[member['user_id']]: member['name']
+            for member in members
+            if member.get('name') and old_names.get(member['user_id']) not in (None, member['name'])
+        }
+        if not renames:
+            return False
+        case = ' '.join(['WHEN %s THEN %s'] * len(renames))
+        cursor.execute(
+            f"UPDATE item_info SET wis = CASE wis {case} END "
+            f"WHERE wis IN ({', '.join(['%s'] * len(renames))})",
+            tuple(value for pair in renames.items() for value in pair) + tuple(renames))
+        return True
+
+    def delete_member(self, user_id: str):
+        """删除用户"""
+        super().delete('members', 'user_id', user_id)
+
+    def get_member(
+        self,
+        user_id: str | None = None,
+        open_id: str | None = None,
+        user_name: str | None = None
+    ) -> dict[str, list]:
         """"
         获取用户信息
 
@@ -364,6 +560,10 @@ class Database(MySql) :
             member = super().fetchone('members', 'user_id', user_id)
         elif open_id:
             member = super().fetchone('members', 'open_id', open_id)
+        elif user_name:
+            member = super().fetchone('members', 'name', user_name)
+        else:
+            member = None
         if member:
             return {
                 'user_id': member[0],
@@ -373,8 +573,14 @@ class Database(MySql) :
                 'root': member[4]
             }
         else:
-            raise ValueError(f"无法找到目标用户 user_id:{user_id}")
-    
+            raise ValueError(f"无法找到目标用户 {user_id or open_id or user_name}")
+
+    def get_borrower_ids(self) -> list[str]:
+        """获取当前持有已借出物品的用户的user_id(物品位置`wis`为持有者用户名)"""
+        items = super().fetchall('item_info', 'useable', 0) or []
+        holders = {item[3] for item in items}
+        return [member['user_id'] for member in self.get_all_members() if member['name'] in holders]
+
     def get_members_root(self) -> dict[str, list]:
         """"
         获取所有管理员用户信息
@@ -796,8 +1002,9 @@ class Database(MySql) :
             不可用,返回None
         """
         result = super().fetchone('members','user_id',user_id)
-        return result[3] if (result and result[3] not in ('null',None) and
-            time.time()-int(result[4])/1000<1036800) else None
+        # members表的列: user_id, open_id, union_id, name, root, card_message_id, card_message_create_time
+        return result[5] if (result and result[5] not in ('null',None) and result[6] and
+            time.time()-int(result[6])/1000<1036800) else None
     
     def is_user_root(self, user_id: str) -> bool:
         """判断用户是不是管理员"""
@@ -841,6 +1048,7 @@ class Database(MySql) :
 
 def init_database(database : Database):
     """初始化数据库"""
+    database.check_connection()
     if not database.is_database_exists(database.db):
         database.create_database(database.db)
     database.set_default_db(database.db)
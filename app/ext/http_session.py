@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app import app
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HTTP_CONFIG = {
+    "pool_connections": 10,     # 每个session缓存连接池的host数
+    "pool_maxsize": 20,         # 每个host的最大空闲连接数
+    "connect_timeout": 3.05,
+    "read_timeout": 10,
+    "retries": 3,               # 连接失败和status_forcelist中的状态码的重试次数
+    "backoff_factor": 0.5,      # 重试间隔 backoff_factor * 2^(n-1) 秒，429/503会优先使用Retry-After
+    "status_forcelist": [429, 500, 502, 503, 504],
+    # 只对幂等的请求重试；连接失败(请求未发出)时所有请求都会重试
+    "retry_methods": ["GET", "HEAD", "OPTIONS"],
+}
+
+_sessions = {}
+_sessions_pid = None
+_lock = threading.Lock()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """未指定timeout的请求使用默认的(连接超时, 读取超时)"""
+
+    def __init__(self, timeout, *args, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def load_http_config(http_config: dict | None = None) -> dict:
+    """合并settings.json中http的配置与默认配置"""
+    return {**DEFAULT_HTTP_CONFIG, **(http_config or app.config.get("http") or {})}
+
+
+def create_session(http_config: dict | None = None, **overrides) -> requests.Session:
+    """
+    创建使用连接池、默认超时和重试的session
+
+    Args:
+        http_config: http配置，默认使用settings.json中的配置
+        **overrides: 覆盖配置中的项，如`retry_methods=["POST"]`
+    """
+    config = {**load_http_config(http_config), **overrides}
+    retry = Retry(
+        total=config["retries"],
+        backoff_factor=config["backoff_factor"],
+        status_forcelist=config["status_forcelist"],
+        allowed_methods=frozenset(config["retry_methods"]),
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        (config["connect_timeout"], config["read_timeout"]),
+        pool_connections=config["pool_connections"],
+        pool_maxsize=config["pool_maxsize"],
+        max_retries=retry,
+    )
+    session = requests.Session()
+    # session被所有请求共用，不保存响应中的cookie，需要cookie的请求通过cookies参数传入
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(name: str = "default", **overrides) -> requests.Session:
+    """
+    获取当前进程中共用的session，同一个host的请求复用keep-alive连接
+
+    session不会保存响应中的cookie。fork出的子进程会重新创建session，不共用父进程的连接
+
+    Args:
+        name: session名，重试等配置不同的请求使用不同的session
+        **overrides: 首次创建该session时覆盖的配置，参考`create_session`
+    """
+    global _sessions_pid
+    pid = os.getpid()
+    session = _sessions.get(name) if _sessions_pid == pid else None
+    if session is not None:
+        return session
+    with _lock:
+        if _sessions_pid != pid:
+            _sessions.clear()
+            _sessions_pid = pid
+        if name not in _sessions:
+            _sessions[name] = create_session(**overrides)
+        return _sessions[name]
+
+
+def get_http_pool_stats() -> dict:
+    """
+    获取当前进程中各session的连接池统计数据
+
+    Return:
+        {
+            session名: {
+                host: {'connections': 已建立的连接数, 'requests': 已发送的请求数, 'idle': 空闲连接数}
+            }
+        }
+    """
+    stats = {}
+    for name, session in list(_sessions.items()):
+        hosts = {}
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                idle = sum(1 for conn in pool.pool.queue if conn is not None) if pool.pool else 0
+                hosts[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                    "connections": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "idle": idle,
+                }
+        stats[name] = hosts
+    return stats
@@ -0,0 +1,196 @@
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+import colorlog
+import ujson
+
+from scripts.utils import get_project_root, load_file
+
+DEFAULT_LOGGING_CONFIG = {
+    "level": "INFO",
+    "json": False,          # 文件日志是否输出为json(每行一条)
+    "queue_size": 10000,    # 日志队列长度，写入跟不上时丢弃新的日志
+    "levels": {},           # 按模块设置日志级别，如 {"werkzeug": "WARNING"}
+}
+# json日志中附加的结构化字段，通过`log_context`绑定或在extra中传入
+STRUCTURED_FIELDS = ("event_id", "user_id", "handler", "duration")
+
+_log_context = contextvars.ContextVar("log_context", default={})
+_queue_handler = None
+_listener = None
+
+
+@contextmanager
+def log_context(**fields):
+    """
+    在with块内为当前线程(协程)输出的日志附加结构化字段
+
+    Example:
+        with log_context(event_id=event_id, handler="card_action"):
+            logger.info("...")   # json日志中带有event_id和handler
+    """
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def bind_log_context(**fields):
+    """向当前`log_context`追加字段(如处理过程中才获取到的user_id)"""
+    _log_context.set({**_log_context.get(), **fields})
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    只把日志放入队列的处理器，格式化和写入由`QueueListener`的后台线程完成
+
+    参数均为不可变类型时推迟到后台线程格式化，否则在当前线程格式化，避免参数在写入前被修改
+    """
+
+    _IMMUTABLE_TYPES = (str, int, float, bool, type(None))
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(a, self._IMMUTABLE_TYPES) for a in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行json"""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return ujson.dumps(data, ensure_ascii=False)
+
+
+def load_logging_config() -> dict:
+    """读取settings.json中的logging配置(可能在导入app之前调用，因此直接读取文件)"""
+    config = load_file(os.path.join(get_project_root(), "settings.json")).get("logging") or {}
+    return {**DEFAULT_LOGGING_CONFIG, **config}
+
+
+def init_logging(level=None, log_config: dict | None = None):
+    """
+    配置根日志，开发服务器、gunicorn、celery共用
+
+    根日志只挂一个`ContextQueueHandler`，文件和控制台的写入在后台线程中完成，
+    fork出的子进程会自动重建队列和后台线程。重复调用时只生效一次。
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+    config = log_config or load_logging_config()
+
+    # 配置日志目录
+    logs_dir = os.path.join(get_project_root(), ".logs")
+    os.makedirs(logs_dir, exist_ok=True)
+
+    # 文件日志处理器：按日期切分日志文件
+    file_handler = TimedRotatingFileHandler(
+        os.path.join(logs_dir, "app.log"),  # 日志文件路径
+        when="midnight",                    # 切分周期设置为午夜（每天00:00）
+        interval=1,                         # 每1天切分一次（即每天0点切分）
+        backupCount=7,                      # 保留最近7天的日志文件
+        encoding="utf-8"                    # 文件编码格式为 utf-8
+    )
+
+    # 格式化日期后缀为 "YYYY-MM-DD.log"
+    file_handler.suffix = "%Y-%m-%d.log"  # 日志文件名的日期部分，例如：app-2025-02-27.log
+    if config["json"]:
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(name)s [%(levelname)s] %(message)s"))
+
+    # 控制台日志处理器：使用 colorlog 为不同级别添加颜色
+    console_handler = colorlog.StreamHandler()
+    console_handler.setFormatter(colorlog.ColoredFormatter(
+        "%(log_color)s%(asctime)s %(name)s [%(levelname)s] %(message)s",
+        log_colors={
+            "DEBUG": "blue",
+            "INFO": "green",
+            "WARNING": "yellow",
+            "ERROR": "red",
+            "CRITICAL": "magenta",
+        }
+    ))
+
+    _queue_handler = ContextQueueHandler(queue.Queue(config["queue_size"]))
+    _listener = QueueListener(_queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level or config["level"])
+    # 按模块设置日志级别
+    for name, module_level in config["levels"].items():
+        logging.getLogger(name).setLevel(module_level)
+
+
+def get_logging_stats() -> dict:
+    """获取当前进程日志队列的统计数据"""
+    if _queue_handler is None:
+        return {}
+    return {"pid": os.getpid(), "queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
+
+
+def log_duration(logger: logging.Logger, msg: str, start: float, level=logging.INFO):
+    """输出从start(time.perf_counter())开始的耗时，json日志中记录在duration字段(毫秒)"""
+    duration = round((time.perf_counter() - start) * 1000, 3)
+    logger.log(level, "%s (%.1fms)", msg, duration, extra={"duration": duration})
+
+
+def _stop_listener():
+    # 退出前写完队列中剩余的日志
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _restart_listener_in_child():
+    # 子进程不会继承后台线程，父进程的队列锁可能处于被持有的状态，重建队列和线程
+    if _listener is None:
+        return
+    _queue_handler.queue = queue.Queue(_queue_handler.queue.maxsize)
+    _listener.queue = _queue_handler.queue
+    _listener._thread = None
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_listener_in_child)
@@ -1,24 +1,86 @@
 import logging
+import os
 import sys
 
 import redis
 
 logger = logging.getLogger(__name__)
 
-def init_redis(redis_config):
+def init_redis(redis_config, check: bool = True):
+    """
+    创建redis客户端
+
+    redis-py的连接池在首次执行命令时才建立连接，并会在fork后的子进程中自动重建,
+    因此可以在导入时创建客户端
+
+    连接数达到max_connections时，新的请求最多等待pool_timeout秒，而不是直接抛出ConnectionError
+
+    Args:
+        redis_config: settings.json中的redis配置,可通过max_connections限制连接池大小
+        check: 是否立即验证连接
+    """
+    pool = redis.BlockingConnectionPool(
+        host=redis_config.get("host", "localhost"),
+        port=redis_config.get("port", 6379),
+        db=redis_config.get("db", 0),
+        max_connections=redis_config.get("max_connections", 20),
+        timeout=redis_config.get("pool_timeout", 5),
+        health_check_interval=redis_config.get("health_check_interval", 30)
+    )
+    redis_client = redis.Redis(connection_pool=pool)
+    if check:
+        check_redis(redis_client)
+    return redis_client
+
+def check_redis(redis_client: redis.Redis):
+    """验证redis连接,无法连接时退出程序"""
+    redis_path = f'redis://{redis_client.connection_pool.connection_kwargs["host"]}:{redis_client.connection_pool.connection_kwargs["port"]}/{redis_client.connection_pool.connection_kwargs["db"]}'
     try:
-        redis_client = redis.Redis(
-            host=redis_config.get("host", "localhost"),
-            port=redis_config.get("port", 6379),
-            db=redis_config.get("db", 0)
-        )
-        redis_path = f'redis://{redis_client.connection_pool.connection_kwargs["host"]}:{redis_client.connection_pool.connection_kwargs["port"]}/{redis_client.connection_pool.connection_kwargs["db"]}'
         # 验证连接
         if redis_client.ping():
             logger.info(f"Redis {redis_path}: 连接成功")
         else:
             logger.error(f"Redis {redis_path}: 连接失败")
-        return redis_client
     except redis.ConnectionError as e:
         sys.exit(f"Redis {redis_path} 连接错误: {e}"
                  "请检查配置")
+
+def reset_redis(redis_client: redis.Redis):
+    """
+    丢弃从父进程继承的连接，下次使用时重新建立
+
+    应在fork后的子进程中调用(`worker_process_init`、`post_fork`等)
+    """
+    # ConnectionPool.reset 只重置连接列表，不会关闭父进程仍在使用的socket
+    redis_client.connection_pool.reset()
+
+def get_redis_pool_stats(redis_client: redis.Redis) -> dict:
+    """
+    获取当前进程的redis连接池统计数据
+
+    Return:
+        {
+            'pid': 进程id,
+            'created': 已建立的连接数,
+            'in_use': 正在使用的连接数,
+            'idle': 空闲连接数,
+            'max_connections': 最大连接数
+        }
+    """
+    pool = redis_client.connection_pool
+    if isinstance(pool, redis.BlockingConnectionPool):
+        # 队列中的None为尚未建立的连接
+        created = len(pool._connections)
+        idle = sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        in_use = created - idle
+    else:
+        created = getattr(pool, "_created_connections", 0)
+        in_use = len(getattr(pool, "_in_use_connections", ()))
+        idle = len(getattr(pool, "_available_connections", ()))
+    return {
+        "pid": os.getpid(),
+        "created": created,
+        "in_use": in_use,
+        "idle": idle,
+        "max_connections": pool.max_connections,
+    }
@@ -0,0 +1,243 @@
+import logging
+import os
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import redis
+import ujson
+from redis.exceptions import LockError
+
+from scripts.utils import get_project_root
+
+logger = logging.getLogger(__name__)
+
+
+def get_deploy_id(startup_config: dict | None = None) -> str:
+    """
+    获取当前部署的标识，同一次部署的所有节点应当一致
+
+    优先级：环境变量DEPLOY_ID > settings.json中的startup.deploy_id > git commit > 'default'
+    """
+    deploy_id = os.environ.get("DEPLOY_ID") or (startup_config or {}).get("deploy_id")
+    if deploy_id:
+        return str(deploy_id)
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=get_project_root(), capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip() or "default"
+    except (OSError, subprocess.SubprocessError):
+        return "default"
+
+
+class StartupJobRegistry:
+    """
+    基于redis锁的一次性启动任务注册表
+
+    多个节点(web副本、gunicorn worker等)同时启动时，只有抢到leader锁的节点执行启动任务，
+    其余节点跳过，或等待leader完成(wait=True)。
+    各任务之间互不依赖，会并发执行，每个任务最多执行job_timeout秒。
+    每个任务的状态和耗时记录在 `startup:<deploy_id>:jobs` 中，同一次部署内不会重复执行；
+    leader中途退出时，锁过期后其他节点可以接手未完成的任务。
+
+    未配置redis时退化为在当前进程中直接执行全部任务。
+    """
+
+    def __init__(self, redis_client: redis.Redis | None, startup_config: dict | None = None):
+        startup_config = startup_config or {}
+        self.redis_client = redis_client
+        self.deploy_id = get_deploy_id(startup_config)
+        self.lock_timeout = startup_config.get("lock_timeout", 600)
+        self.wait = startup_config.get("wait_for_leader", False)
+        self.wait_timeout = startup_config.get("wait_timeout", 300)
+        self.registry_ttl = startup_config.get("registry_ttl", 86400)
+        self.job_timeout = startup_config.get("job_timeout", 300)
+        self.node = f"{socket.gethostname()}:{os.getpid()}"
+        self.prefix = f"startup:{self.deploy_id}"
+        # 当前进程内的任务记录，未配置redis时以此为准
+        self.job_names = []
+        self._local_states = {}
+
+    def get_job_states(self) -> dict[str, dict]:
+        """获取本次部署中各任务的执行记录"""
+        if not self.redis_client:
+            return dict(self._local_states)
+        states = self.redis_client.hgetall(f"{self.prefix}:jobs")
+        return {k.decode(): ujson.loads(v) for k, v in states.items()}
+
+    def get_status(self, job_names: list | None = None) -> dict:
+        """
+        获取启动任务的整体状态
+
+        Return:
+            {
+                'deploy_id': 部署标识,
+                'ready': 是否所有任务都已执行成功,
+                'failed': 执行失败或超时的任务名,
+                'jobs': {任务名: {'status', 'node', 'duration', 'error', ...}}
+            }
+        """
+        states = self.get_job_states()
+        jobs = {name: states.get(name, {"status": "pending"})
+                for name in (job_names or self.job_names)}
+        return {
+            "deploy_id": self.deploy_id,
+            "ready": all(state["status"] == "done" for state in jobs.values()),
+            "failed": [name for name, state in jobs.items() if state["status"] in ("failed", "timeout")],
+            "jobs": jobs,
+        }
+
+    def is_done(self, name: str) -> bool:
+        state = self.redis_client.hget(f"{self.prefix}:jobs", name)
+        return bool(state) and ujson.loads(state).get("status") == "done"
+
+    def _record(self, name: str, status: str, duration: float | None = None, error: str | None = None):
+        state = {
+            "status": status,
+            "node": self.node,
+            "updated_at": int(time.time()),
+            "duration": round(duration, 3) if duration is not None else None,
+            "error": error,
+        }
+        self._local_states[name] = state
+        if self.redis_client:
+            key = f"{self.prefix}:jobs"
+            self.redis_client.hset(key, name, ujson.dumps(state))
+            self.redis_client.expire(key, self.registry_ttl)
+
+    def _run_job(self, name: str, func) -> str:
+        start = time.perf_counter()
+        self._record(name, "running")
+        try:
+            func()
+        except Exception as e:
+            logger.error("启动任务 %s 执行失败: %s" % (name, e))
+            self._record(name, "failed", time.perf_counter() - start, str(e))
+            return "failed"
+        self._record(name, "done", time.perf_counter() - start)
+        logger.info("启动任务 %s 执行完成,耗时 %.2fs" % (name, time.perf_counter() - start))
+        return "done"
+
+    def _run_jobs(self, jobs: dict, lock=None) -> dict[str, str]:
+        """
+        并发执行任务，超过job_timeout仍未完成的任务记为timeout
+
+        任务线程不会被中断，超时的任务会继续执行，结束后更新为done/failed；
+        传入lock时由本方法负责释放，在所有任务线程结束前持续续期，避免其他节点接手后重复执行仍在运行的任务
+        """
+        not_done = set()
+        try:
+            if not jobs:
+                return {}
+            executor = ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="startup")
+            futures = {executor.submit(self._run_job, name, func): name for name, func in jobs.items()}
+            start = time.monotonic()
+            not_done = set(futures)
+            while not_done and time.monotonic() - start < self.job_timeout:
+                remaining = self.job_timeout - (time.monotonic() - start)
+                _, not_done = wait(not_done, timeout=min(remaining, self.lock_timeout / 3))
+                if lock and not_done:
+                    # 任务执行期间续期，避免leader锁过期
+                    lock.reacquire()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+            results = {}
+            for future, name in futures.items():
+                if future in not_done:
+                    logger.error("启动任务 %s 执行超时(%ss)" % (name, self.job_timeout))
+                    self._record(name, "timeout", time.monotonic() - start)
+                    results[name] = "timeout"
+                else:
+                    results[name] = future.result()
+            return results
+        finally:
+            if lock and not_done:
+                self._hold_lock(lock, not_done)
+            elif lock:
+                self._release_lock(lock)
+
+    def _hold_lock(self, lock, futures: set):
+        """在后台线程中为超时仍在执行的任务续期leader锁，任务线程全部结束后释放"""
+
+        def target():
+            pending = futures
+            try:
+                while pending:
+                    _, pending = wait(pending, timeout=self.lock_timeout / 3)
+                    if pending:
+                        lock.reacquire()
+            except LockError as e:
+                logger.error("启动任务leader锁续期失败: %s" % e)
+            finally:
+                self._release_lock(lock)
+
+        threading.Thread(target=target, name="startup-lock", daemon=True).start()
+
+    @staticmethod
+    def _release_lock(lock):
+        try:
+            lock.release()
+        except LockError:
+            pass
+
+    def run_in_background(self, jobs: dict) -> threading.Thread:
+        """在后台线程中执行`run`，不阻塞调用者，执行状态通过`get_status`查询"""
+        self.job_names = list(jobs)
+
+        def target():
+            results = self.run(jobs)
+            logger.info("启动任务执行结果: %s" % results)
+
+        thread = threading.Thread(target=target, name="startup-jobs", daemon=True)
+        thread.start()
+        return thread
+
+    def run(self, jobs: dict) -> dict[str, str]:
+        """
+        执行启动任务
+
+        Args:
+            jobs: {任务名: 无参函数}，并发执行
+
+        Return:
+            {任务名: 状态}，状态为
+                done:    在当前节点执行成功
+                failed:  执行失败
+                timeout: 执行或等待其他节点执行超时
+                skipped: 本次部署中已执行过
+                leader:  由其他节点执行(未等待)
+        """
+        self.job_names = list(jobs)
+        if not self.redis_client:
+            return self._run_jobs(jobs)
+
+        # 超时的任务结束前由其他线程续期和释放锁，token不能只保存在当前线程
+        lock = self.redis_client.lock(f"{self.prefix}:leader", timeout=self.lock_timeout, thread_local=False)
+        if lock.acquire(blocking=False):
+            logger.info("节点 %s 成为启动任务leader, deploy_id:%s" % (self.node, self.deploy_id))
+            try:
+                pending = {name: func for name, func in jobs.items() if not self.is_done(name)}
+            except Exception:
+                self._release_lock(lock)
+                raise
+            results = {name: "skipped" for name in jobs if name not in pending}
+            # 锁由`_run_jobs`在所有任务线程结束后释放
+            results.update(self._run_jobs(pending, lock))
+            return results
+
+        logger.info("其他节点正在执行启动任务, deploy_id:%s" % self.deploy_id)
+        if not self.wait:
+            return {name: "skipped" if self.is_done(name) else "leader" for name in jobs}
+        deadline = time.monotonic() + self.wait_timeout
+        pending = list(jobs)
+        while pending and time.monotonic() < deadline:
+            pending = [name for name in pending if not self.is_done(name)]
+            if pending and not lock.locked():
+                # leader已退出但仍有任务未完成(执行失败或进程退出)
+                return {name: "failed" if name in pending else "skipped" for name in jobs}
+            if pending:
+                time.sleep(1)
+        return {name: "timeout" if name in pending else "skipped" for name in jobs}
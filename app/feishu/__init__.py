@@ -4,22 +4,58 @@ from flask import Blueprint
 feishu_bp = Blueprint("feishu", __name__, url_prefix="/feishu")
 
 
+# 飞书初始化任务名，用于在未执行初始化的进程(如gunicorn worker)中查询状态
+STARTUP_JOB_NAMES = [
+    "update_members",
+    "sub_approval_event",
+    "traverse_threads_and_create_inventories",
+    "check_bitables",
+]
+# 当前进程中执行初始化任务的注册表
+startup_registry = None
+
+
 def init_project_feishu(feishu_config):
+    """
+    在后台线程中并发执行飞书初始化任务，不阻塞蓝图注册和请求处理
+
+    多节点部署时只在leader节点上执行一次，执行状态可通过`/readyz`查询
+    """
     from .commands.init import (
         update_members,
         sub_approval_event,
         traverse_threads_and_create_inventories,
         check_bitables,
     )
+    from app import app
+    from app.ext.startup import StartupJobRegistry
+    from .config import redis_client
 
-    # 执行初始化流程
-    update_members()
-    sub_approval_event()
-    traverse_threads_and_create_inventories()
-    check_bitables()
+    global startup_registry
+    startup_registry = StartupJobRegistry(redis_client, app.config.get("startup"))
+    startup_registry.run_in_background({
+        "update_members": update_members,
+        "sub_approval_event": sub_approval_event,
+        "traverse_threads_and_create_inventories": traverse_threads_and_create_inventories,
+        "check_bitables": check_bitables,
+    })
 
     test_func()
-    # 注册蓝图
+
+
+def get_startup_status() -> dict:
+    """获取飞书初始化任务的执行状态，参考`StartupJobRegistry.get_status`"""
+    global startup_registry
+    if startup_registry is None:
+        from app import app
+        from app.ext.startup import StartupJobRegistry
+        from .config import redis_client
+        startup_registry = StartupJobRegistry(redis_client, app.config.get("startup"))
+    return startup_registry.get_status(STARTUP_JOB_NAMES)
+
+
+def register_feishu_blueprints():
+    """注册飞书相关的子蓝图"""
     from .events import events_bp
     from .web import web_bp
 
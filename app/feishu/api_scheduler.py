@@ -0,0 +1,299 @@
+import logging
+import random
+import threading
+import time
+
+from requests import HTTPError, RequestException
+
+from scripts.api.feishu import LarkException
+
+logger = logging.getLogger(__name__)
+
+# 飞书频率限制的错误码
+RATE_LIMIT_CODE = 99991400
+# 只读接口的方法名前缀，服务端错误时可以安全地重试
+READ_METHOD_PREFIXES = ("get", "list", "reading", "download")
+
+DEFAULT_API_LIMIT_CONFIG = {
+    "default": {"rate": 50, "burst": 50},   # 每秒请求数 / 突发请求数
+    "families": {},                         # 按接口分组设置，如 {"spreadsheet": {"rate": 10, "burst": 20}}
+    "max_retries": 3,
+    "backoff_factor": 0.5,                  # 重试间隔 backoff_factor * 2^n 秒(带随机抖动)
+    "max_backoff": 30,
+    "breaker_threshold": 5,                 # 连续失败多少次后熔断
+    "breaker_timeout": 30,                  # 熔断后多久(秒)允许试探请求
+}
+
+
+class CircuitOpenError(Exception):
+    """接口分组处于熔断状态，请求未发出"""
+
+    def __init__(self, family, retry_after):
+        self.family = family
+        self.retry_after = retry_after
+
+    def __str__(self) -> str:
+        return f"飞书接口 {self.family} 已熔断，{self.retry_after:.1f}秒后重试"
+
+
+class TokenBucket:
+    """令牌桶，`acquire`在令牌不足时阻塞等待"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """获取一个令牌，返回等待的时间(秒)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，超时后放行一次试探请求，成功则恢复"""
+
+    def __init__(self, threshold: int, timeout: float):
+        self.threshold = threshold
+        self.timeout = timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.timeout else "open"
+
+    def before_call(self, family: str):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.timeout or self._trial:
+                raise CircuitOpenError(family, max(0, self.timeout - elapsed))
+            self._trial = True
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class RateLimitedAPI:
+    """
+    对`APIContainer`的包装，调用方式不变(`api.message.recall(...)`)
+
+    - 按接口分组(`api.<分组>`)限制每秒请求数，超出时在当前线程等待
+    - 触发飞书频率限制(HTTP 429 / 错误码99991400)时按响应头中的重置时间或指数退避重试，
+      只读接口遇到服务端错误、网络错误时同样重试
+    - 分组内连续失败达到阈值后熔断，熔断期间直接抛出`CircuitOpenError`
+    - 按接口记录调用次数、错误数和耗时，参考`get_stats`
+
+    限流和熔断状态只在当前进程内有效。
+    """
+
+    def __init__(self, container, api_limit_config: dict | None = None):
+        config = {**DEFAULT_API_LIMIT_CONFIG, **(api_limit_config or {})}
+        self._container = container
+        self._config = config
+        self._buckets = {}
+        self._breakers = {}
+        self._groups = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        group = getattr(self._container, name)
+        if callable(group):
+            return group
+        with self._lock:
+            if name not in self._groups:
+                self._groups[name] = _APIGroup(self, name, group)
+                self._init_family(name)
+            return self._groups[name]
+
+    def wrap(self, family: str, method: str, func):
+        """
+        使`APIContainer`之外的接口调用(如直接请求开放接口)同样经过限流、重试和熔断
+
+        Args:
+            family: 接口分组，与同名分组(如`message`)共用频率限制和熔断状态
+            method: 方法名，用于统计；以`READ_METHOD_PREFIXES`开头的方法遇到服务端错误时重试
+            func: 实际发出请求的函数
+
+        Example:
+            batch_send = api.wrap("message", "batch_send", send_func)
+            batch_send(...)
+        """
+        with self._lock:
+            if family not in self._buckets:
+                self._init_family(family)
+
+        def wrapper(*args, **kwargs):
+            return self._call(family, method, func, *args, **kwargs)
+
+        wrapper.__name__ = method
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+    def _init_family(self, family):
+        """创建分组的令牌桶和熔断器，调用方需持有`self._lock`"""
+        if family in self._buckets:
+            return
+        limit = {**self._config["default"], **self._config["families"].get(family, {})}
+        self._buckets[family] = TokenBucket(limit["rate"], limit["burst"])
+        self._breakers[family] = CircuitBreaker(self._config["breaker_threshold"],
+                                                self._config["breaker_timeout"])
+
+    def _call(self, family: str, method: str, func, *args, **kwargs):
+        """限流、重试并记录一次接口调用"""
+        bucket = self._buckets[family]
+        breaker = self._breakers[family]
+        stats = self._get_method_stats(f"{family}.{method}")
+        retry_transient = method.startswith(READ_METHOD_PREFIXES)
+        attempt = 0
+        while True:
+            breaker.before_call(family)
+            bucket.acquire()
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                rate_limited, transient, reset = self._classify(e)
+                self._record(stats, elapsed, error=True, rate_limited=rate_limited)
+                if transient:
+                    breaker.on_failure()
+                else:
+                    # 飞书正常返回了错误信息，不计入熔断
+                    breaker.on_success()
+                if attempt < self._config["max_retries"] and (rate_limited or (transient and retry_transient)):
+                    delay = self._backoff(attempt, reset)
+                    logger.warning("飞书接口 %s.%s 调用失败(%s)，%.2f秒后重试", family, method, e, delay)
+                    stats["retries"] += 1
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+                raise
+            self._record(stats, time.perf_counter() - start)
+            breaker.on_success()
+            return result
+
+    def get_stats(self) -> dict:
+        """
+        获取当前进程中各接口的调用统计和熔断状态
+
+        Return:
+            {
+                'methods': {'分组.方法': {'calls', 'errors', 'rate_limited', 'retries', 'avg_ms', 'max_ms'}},
+                'breakers': {'分组': 'closed' | 'open' | 'half_open'}
+            }
+        """
+        with self._lock:
+            methods = {
+                name: {
+                    "calls": s["calls"],
+                    "errors": s["errors"],
+                    "rate_limited": s["rate_limited"],
+                    "retries": s["retries"],
+                    "avg_ms": round(s["total"] / s["calls"] * 1000, 3) if s["calls"] else 0,
+                    "max_ms": round(s["max"] * 1000, 3),
+                }
+                for name, s in self._stats.items()
+            }
+            breakers = {name: breaker.state for name, breaker in self._breakers.items()}
+        return {"methods": methods, "breakers": breakers}
+
+    def _get_method_stats(self, name) -> dict:
+        stats = self._stats.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(
+                    name, {"calls": 0, "errors": 0, "rate_limited": 0, "retries": 0, "total": 0.0, "max": 0.0})
+        return stats
+
+    def _record(self, stats, elapsed, error=False, rate_limited=False):
+        with self._lock:
+            stats["calls"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            if error:
+                stats["errors"] += 1
+            if rate_limited:
+                stats["rate_limited"] += 1
+
+    def _backoff(self, attempt, reset) -> float:
+        if reset:
+            return min(reset, self._config["max_backoff"]) + random.uniform(0, 0.5)
+        delay = self._config["backoff_factor"] * 2 ** attempt
+        return min(delay, self._config["max_backoff"]) * random.uniform(0.5, 1.5)
+
+    @staticmethod
+    def _classify(e: Exception):
+        """
+        判断异常类型
+
+        Return:
+            (是否触发频率限制, 是否为服务端/网络错误, 频率限制的重置时间(秒))
+        """
+        # LarkException及直接请求开放接口时的FeishuException都带有飞书的错误码
+        if getattr(e, "code", None) == RATE_LIMIT_CODE:
+            return True, False, None
+        if isinstance(e, LarkException):
+            return False, False, None
+        if isinstance(e, HTTPError) and e.response is not None:
+            status = e.response.status_code
+            if status == 429:
+                headers = e.response.headers
+                reset = headers.get("x-ogw-ratelimit-reset") or headers.get("Retry-After")
+                try:
+                    reset = float(reset) if reset else None
+                except ValueError:
+                    reset = None
+                return True, False, reset
+            return False, status >= 500, None
+        return False, isinstance(e, RequestException), None
+
+
+class _APIGroup:
+    """`APIContainer`中的一个接口分组，如`api.message`"""
+
+    def __init__(self, scheduler: RateLimitedAPI, family: str, group):
+        self._scheduler = scheduler
+        self._family = family
+        self._group = group
+
+    def __getattr__(self, name):
+        attr = getattr(self._group, name)
+        if not callable(attr):
+            return attr
+        scheduler, family = self._scheduler, self._family
+
+        def wrapper(*args, **kwargs):
+            return scheduler._call(family, name, attr, *args, **kwargs)
+
+        wrapper.__name__ = name
+        wrapper.__doc__ = attr.__doc__
+        # 缓存包装后的方法，下次不再经过__getattr__
+        setattr(self, name, wrapper)
+        return wrapper
@@ -0,0 +1,62 @@
+import secrets
+
+import redis
+
+# 消息卡片的有效期(与Database.is_alive_card一致)
+DEFAULT_CART_TTL = 1036800
+
+
+class SelectionCart:
+    """
+    消息卡片中已选中的物品列表，存储在redis中
+
+    卡片的按钮里只保存cart_id，勾选、取消勾选、提交申请时由回调直接修改redis中的数据，
+    卡片和回调请求的大小不再随已选中物品的数量增长。
+
+    key为 `cart:<user_id>:<cart_id>`，hash结构 {oid: 物品名}，
+    同一张卡片在更新时沿用同一个cart_id，发送新卡片时新建。
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        user_id: str,
+        cart_id: str | None = None,
+        ttl: int = DEFAULT_CART_TTL
+    ):
+        self.redis_client = redis_client
+        self.user_id = user_id
+        self.cart_id = cart_id or secrets.token_hex(4)
+        self.ttl = ttl
+        self.key = f"cart:{user_id}:{self.cart_id}"
+
+    def add(self, oid: str, name: str):
+        """选中物品"""
+        pipe = self.redis_client.pipeline()
+        pipe.hset(self.key, str(oid), name)
+        pipe.expire(self.key, self.ttl)
+        pipe.execute()
+
+    def remove(self, *oids: str):
+        """取消选中物品"""
+        if oids:
+            self.redis_client.hdel(self.key, *(str(oid) for oid in oids))
+
+    def clear(self):
+        """清空已选中物品"""
+        self.redis_client.delete(self.key)
+
+    def get_items(self) -> dict[str, str]:
+        """获取已选中物品 {oid: 物品名}，按oid排序"""
+        items = self.redis_client.hgetall(self.key)
+        return {oid.decode(): items[oid].decode() for oid in sorted(items)}
+
+    def get_selected_object_list(self) -> dict[str, list]:
+        """
+        获取已选中物品
+
+        Return:
+            {'name': [物品名], 'oid': [物品oid]}，与审批表单中的objectList格式一致
+        """
+        items = self.get_items()
+        return {'name': list(items.values()), 'oid': list(items.keys())}
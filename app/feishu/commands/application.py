@@ -1,30 +1,65 @@
 import re
 import ujson
 import logging
-import copy
 import time
 from datetime import datetime
 
 from ..config import database
+from ..config import redis_client
 from ..config import FEISHU_CONFIG as _fs
 from app.decorators import celery_task
+from app.ext.cache import VersionedCache
+from ..cart import SelectionCart, DEFAULT_CART_TTL
 from scripts.api.feishu import LarkException
 from scripts.utils import (
     can_convert_to_int,
     format_with_margin,
-    replace_placeholders,
+    format_column,
+    compile_template,
     safe_get,
     load_file
 )
 
 logger = logging.getLogger(__name__)
 
-# 消息卡片数据
+# 消息卡片数据(启动时预编译为模板，渲染时直接生成新对象，无需深拷贝)
 card_json = load_file("message_card.json")
-CARD_DISPLAY_JSON = card_json.get('display')
-CARD_DISPLAY_REPEAT_ELEMENTS_JSON = card_json.get('display_repeat_elements')
-BUTTON_CONFIRM_JSON = card_json.get('button_confirm')
-FORM_JSON = card_json.get('form')
+CARD_DISPLAY_TEMPLATE = compile_template(card_json.get('display'))
+CARD_DISPLAY_REPEAT_ELEMENTS_TEMPLATE = compile_template(card_json.get('display_repeat_elements'))
+BUTTON_CONFIRM_TEMPLATE = compile_template(card_json.get('button_confirm'))
+FORM_TEMPLATE = compile_template(card_json.get('form'))
+PAGE_BUTTON_TEMPLATE = compile_template(card_json.get('page_button'))
+# 各页面的标题和列名
+TITLE_MAP = {
+    '0':{'title':"个人仓库", 'param1':'ID', 'param2':'名称', 'param3':'状态'},
+    '1':{'title':"物资类型", 'param1':'ID', 'param2':'名称', 'param3':'数量'},
+    '2':{'title':"物品总览", 'param1':'ID', 'param2':'名称', 'param3':'数量'},
+    '3':{'title':"物资仓库", 'param1':'ID', 'param2':'名称', 'param3':'状态'},
+    '4':{'title':"物品总览", 'param1':'ID', 'param2':'名称', 'param3':'数量'},
+}
+# 卡片行中保存cart_id的位置
+ROW_CART_PATHS = (
+    ('button_area', 'buttons', 0, 'value', 'cart_id'),
+    ('behaviors', 0, 'value', 'cart_id'),
+)
+# 卡片物品列表缓存，物资相关的表被修改时失效
+CARD_CONFIG = getattr(_fs, 'card', None)
+CART_TTL = getattr(CARD_CONFIG, 'cart_ttl', DEFAULT_CART_TTL)
+# 分页显示的页面每页的行数，以及物品列表部分的最大字节数(飞书卡片最大30KB)
+CARD_PAGE_SIZE = getattr(CARD_CONFIG, 'page_size', 20)
+CARD_MAX_BYTES = getattr(CARD_CONFIG, 'max_bytes', 20000)
+# 同一张卡片的更新请求的合并窗口(秒)
+CARD_UPDATE_DEBOUNCE = getattr(CARD_CONFIG, 'update_debounce', 0.3)
+# 原子地递增卡片的更新序号并保存最新的更新参数
+_save_card_update = redis_client.register_script("""
+local seq = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+return seq
+""")
+card_cache = VersionedCache(redis_client, "card", maxsize=getattr(CARD_CONFIG, 'cache_size', 256))
+ITEM_TABLES = ('item_info', 'item_list', 'item_category')
+database.add_write_listener(lambda tables: card_cache.invalidate() if not tables.isdisjoint(ITEM_TABLES) else None)
 # 云文档参数
 ITEM_SHEET_TOKEN = _fs.sheet.token
 SHEET_ID_ITEM = _fs.sheet.sheet_id_ITEM
@@ -34,37 +69,61 @@ APPROVAL_CODE = _fs.approval.approval_code
 '''
 private function
 '''
-@celery_task
-def update_message_card(
-    token: str, 
-    object_id: int | None = None, 
-    user_id: str | None = None, 
-    target: str | None = None, 
-    selectedObjectList: list | None = None
-):
-    """
-    更新消息卡片
-    """
+def _update_message_card(token, object_id, user_id, target, cart_id, cursor):
+    """更新消息卡片，由`flush_card_update`调用，事件中请使用`request_card_update`"""
     data = create_message_card_date(object_id, user_id, 
-                                      target, selectedObjectList)
+                                      target, cart_id, cursor)
     if data:
         logger.info("更新卡片token: %s" % token)
         _fs.api.message.delay_update_message_card(token, data)
 
-@celery_task
+def request_card_update(
+    card_id: str,
+    token: str,
+    object_id: int | None = None,
+    user_id: str | None = None,
+    target: str | None = None,
+    cart_id: str | None = None,
+    cursor: str | None = None
+):
+    """
+    请求更新消息卡片，合并短时间内对同一张卡片的多次更新
+
+    每次交互的token都不同，因此按卡片(open_message_id)合并：
+    最新的更新参数保存在redis中，`CARD_UPDATE_DEBOUNCE`秒后由`flush_card_update`执行，
+    执行时已有更新的请求则跳过，连续勾选多个物品只会渲染并发送一次。
+
+    Args:
+        card_id: 消息卡片的open_message_id
+        token: 本次交互的token，用于更新卡片
+        其余参数参考`create_message_card_date`
+    """
+    state = {'token': token, 'object_id': object_id, 'user_id': user_id,
+             'target': target, 'cart_id': cart_id, 'cursor': cursor}
+    ttl = max(int(CARD_UPDATE_DEBOUNCE * 10), 60)
+    seq = _save_card_update(keys=[f"card_update:{card_id}:seq", f"card_update:{card_id}"],
+                            args=[ujson.dumps(state), ttl])
+    flush_card_update(card_id, seq)
+
+@celery_task(queue="interactive", ignore_result=True, countdown=CARD_UPDATE_DEBOUNCE)
+def flush_card_update(card_id: str, seq: int):
+    """执行合并后的卡片更新，已有更新的请求时跳过(由之后的任务执行)"""
+    latest_seq = redis_client.get(f"card_update:{card_id}:seq")
+    if not latest_seq or int(latest_seq) != seq:
+        return
+    state = redis_client.get(f"card_update:{card_id}")
+    if state:
+        _update_message_card(**ujson.loads(state))
+
+@celery_task(queue="interactive", ignore_result=True)
 def send_a_new_message_card(user_id: str, content: dict):
     """
     发送新消息卡片
 
-    如果之前该用户已有消息卡片，先撤回再发送新卡片
+    先发送新卡片并记录为该用户的当前卡片，之前的卡片在后台撤回(`recall_message_card`)
     """
     try:
         alive_card_id = database.is_alive_card(user_id)
-        if alive_card_id:
-            logger.info("撤回与 %s 的消息卡片 %s" % (user_id,alive_card_id))
-            database.update_card(user_id)
-            _fs.api.message.recall(alive_card_id)
-
         result = _fs.api.message.send_interactive_with_user_id(user_id, content)
         message_id = safe_get(result,'data','message_id')
         create_time = safe_get(result,'data','create_time')
@@ -72,43 +131,83 @@ def send_a_new_message_card(user_id: str, content: dict):
         database.update_card(user_id,message_id,create_time)
     except LarkException as e:
         logger.error("发送消息失败: %s" % e)
+        return
+    if alive_card_id and alive_card_id != message_id:
+        recall_message_card(user_id, alive_card_id)
+
+@celery_task(queue="interactive", ignore_result=True, background=True)
+def recall_message_card(user_id: str, message_id: str):
+    """撤回用户的旧消息卡片，celery未运行时在后台线程中执行"""
+    try:
+        logger.info("撤回与 %s 的消息卡片 %s" % (user_id,message_id))
+        _fs.api.message.recall(message_id)
+    except LarkException as e:
+        logger.error("撤回消息卡片 %s 失败: %s" % (message_id, e))
+
+def _get_title_id(object_id: int) -> str:
+    """获取对应的表格式id"""
+    if object_id == -2:
+        return '4'
+    elif object_id == -1:
+        return '0'
+    elif object_id == 0:
+        return '1'
+    elif object_id < 1000:
+        return '2'
+    else:
+        return '3'
+
+def _parse_cursor(cursor: str | None) -> tuple[int | None, int | None]:
+    """
+    解析翻页按钮中的cursor
+
+    Return:
+        (after, before)，'next:<id>'表示id之后的一页，'prev:<id>'表示id之前的一页
+    """
+    if cursor:
+        direction, _, id_ = cursor.partition(':')
+        if can_convert_to_int(id_):
+            if direction == 'next':
+                return int(id_), None
+            if direction == 'prev':
+                return None, int(id_)
+    return None, None
+
+def _copy_with(node, path: tuple, value):
+    """返回在path处设置为value的node，只复制路径上的容器，其余部分与原对象共享"""
+    node = node.copy()
+    if len(path) == 1:
+        node[path[0]] = value
+    else:
+        node[path[0]] = _copy_with(node[path[0]], path[1:], value)
+    return node
 
 def create_message_card_date(
         object_id: int, 
         user_id: str | None = None, 
         target: str | None = None, 
-        selectedObjectList: dict[str, list] | None = None
+        cart_id: str | None = None,
+        cursor: str | None = None
     ):
     """
     生成消息卡片数据
+
+    物品列表部分从`card_cache`中获取，只有已选中物品(勾选状态、cart_id、表单)按用户重新生成
+
+    Args:
+        object_id: 页面对应的id
+        user_id: 用户user_id，用于读取已选中物品和个人页
+        target: 搜索内容
+        cart_id: 已选中物品列表的id，参考`SelectionCart`，为空时新建
+        cursor: 翻页位置，参考`_parse_cursor`，为空时显示第一页
     """
-    title_map = {
-        '0':{'CARD_JSON':CARD_DISPLAY_JSON, 'title':"个人仓库", 'param1':'ID', 'param2':'名称', 'param3':'状态'},
-        '1':{'CARD_JSON':CARD_DISPLAY_JSON, 'title':"物资类型", 'param1':'ID', 'param2':'名称', 'param3':'数量'},
-        '2':{'CARD_JSON':CARD_DISPLAY_JSON, 'title':"物品总览", 'param1':'ID', 'param2':'名称', 'param3':'数量'},
-        '3':{'CARD_JSON':CARD_DISPLAY_JSON, 'title':"物资仓库", 'param1':'ID', 'param2':'名称', 'param3':'状态'},
-        '4':{'CARD_JSON':CARD_DISPLAY_JSON, 'title':"物品总览", 'param1':'ID', 'param2':'名称', 'param3':'数量'},
-    }
-    # 获取对应的表格式id
-    if object_id == -2:
-        title_id = '4'
-    elif object_id == -1:
-        title_id = '0'
-    elif object_id == 0:
-        title_id = '1'
-    elif object_id < 1000:
-        title_id = '2'
-    else:
-        title_id = '3'
+    title_map = TITLE_MAP
+    title_id = _get_title_id(object_id)
     _father_id = str(object_id if object_id > 0 else 0)
-    _id = object_id
 
-    # 如果不存在物品选择列表，则初始化
-    if not selectedObjectList:
-        selectedObjectList = {
-            'name':[],
-            'oid':[]
-        }
+    # 读取已选中物品，不存在则新建
+    cart = SelectionCart(redis_client, user_id, cart_id, ttl=CART_TTL)
+    selected_items = cart.get_items() if cart_id else {}
     # 开始构建卡片
     # 标题和列名
     values = {
@@ -122,13 +221,76 @@ def create_message_card_date(
         f"<font color=green>{format_with_margin(title_map[title_id]['param2'],20)}</font>"
     )
     values['title_text']=title_text
-    json_data = copy.deepcopy(title_map[title_id]['CARD_JSON'])
-    result_data = replace_placeholders(json_data, values)
-    # 将已选中物品数据加入到按钮返回值内
-    result_data['elements'][0]['columns'][1]['elements'][0]['behaviors'][0]['value']['selectedObjectList'] = selectedObjectList
-    result_data['elements'][0]['columns'][2]['elements'][0]['behaviors'][0]['value']['selectedObjectList'] = selectedObjectList
-    result_data['elements'][0]['columns'][3]['elements'][0]['value']['selectedObjectList'] = selectedObjectList
-    result_data['elements'][1]['actions'][0]['value']['selectedObjectList'] = selectedObjectList
+    result_data = CARD_DISPLAY_TEMPLATE.render(values)
+    # 将cart_id加入到按钮返回值内
+    result_data['elements'][0]['columns'][1]['elements'][0]['behaviors'][0]['value']['cart_id'] = cart.cart_id
+    result_data['elements'][0]['columns'][2]['elements'][0]['behaviors'][0]['value']['cart_id'] = cart.cart_id
+    result_data['elements'][0]['columns'][3]['elements'][0]['value']['cart_id'] = cart.cart_id
+    result_data['elements'][1]['actions'][0]['value']['cart_id'] = cart.cart_id
+    # 物品列表，个人页与用户相关，搜索页与搜索内容相关
+    cache_key = (title_id, object_id,
+                 user_id if title_id == '0' else None,
+                 target if title_id == '4' else None,
+                 cursor)
+    page = card_cache.get_or_create(
+        cache_key, lambda: _create_card_rows(title_id, object_id, user_id, target, cursor))
+    for oid, row in page['rows']:
+        if row['tag'] == 'checker':
+            #根据已选中物品信息设置勾选器状态
+            if oid is not None and oid in selected_items:
+                row = _copy_with(row, ('checked',), True)
+            #将cart_id加入到返回值内
+            for path in ROW_CART_PATHS:
+                row = _copy_with(row, path, cart.cart_id)
+        result_data['elements'].append(row)
+    #翻页按钮
+    page_buttons = []
+    for text, page_cursor in (("上一页", page['prev']), ("下一页", page['next'])):
+        if page_cursor:
+            button = PAGE_BUTTON_TEMPLATE.render({
+                'text': text, 'id': object_id, 'target': target or '', 'cursor': page_cursor})
+            button['value']['cart_id'] = cart.cart_id
+            page_buttons.append(button)
+    if page_buttons:
+        result_data['elements'].append({"tag": "action", "actions": page_buttons})
+    #设置表单容器
+    form_json = FORM_TEMPLATE.render()
+    #显示已选中物品
+    form_json['elements'][1]['content'] = "\n".join(
+        f"{name}{oid}"
+        for oid, name in zip(selected_items, format_column(selected_items.values(), 20))
+    ) 
+    #返回cart_id
+    form_json['elements'][3]['value']['cart_id'] = cart.cart_id
+    #添加表单容器    
+    result_data['elements'].append(form_json)
+    return result_data
+
+def _create_card_rows(
+        title_id: str,
+        object_id: int,
+        user_id: str | None = None,
+        target: str | None = None,
+        cursor: str | None = None
+    ) -> dict:
+    """
+    查询并生成消息卡片的物品列表部分(与已选中物品无关)
+
+    页面2、3、4按`CARD_PAGE_SIZE`分页查询，所有页面的物品列表不超过`CARD_MAX_BYTES`
+
+    Return:
+        {
+            'rows': [(物品oid, 卡片元素)]，以列表方式呈现的行和提示信息oid为None,
+            'prev': 上一页的cursor，没有时为None,
+            'next': 下一页的cursor，没有时为None
+        }
+    """
+    _id = object_id
+    after, before = _parse_cursor(cursor)
+    backward = before is not None #向前翻页
+    rows = []
+    # 翻页方向上是否还有更多数据，None表示该页面不分页
+    has_more = None
     # 查找相关数据
     _list = None
     display_target = 'list' #默认以列表方式呈现，可选为['list','object']
@@ -139,13 +301,13 @@ def create_message_card_date(
         elif title_id == '1': #仓库（所有物品类型）
             _list = database.get_categories()
         elif title_id == '2': #仓库（某类型的所有物品名）
-            _list = database.get_list(category_id=_id)
+            _list = database.get_list_page(category_id=_id, after=after, before=before, limit=CARD_PAGE_SIZE)
         elif title_id == '3': #仓库（某名字的所有物品信息）
-            _list = database.get_items(name_id=_id)
+            _list = database.get_items_page(name_id=_id, after=after, before=before, limit=CARD_PAGE_SIZE)
             display_target = 'object'
         elif title_id == '4': #仓库(搜索页)
-            #尝试将字符串作为id进行搜索
-            if can_convert_to_int(target) and int(target)>0: #id
+            #尝试将字符串作为id进行搜索(仅第一页)
+            if not cursor and can_convert_to_int(target) and int(target)>0: #id
                 try:
                     if int(target)>1000000:  #oid
                         _list = database.get_item(oid=target)
@@ -157,12 +319,14 @@ def create_message_card_date(
             #同时按名称搜索相关物品
             if display_target == 'list':
                 if not _list:
-                    _list = database.get_list(name=target)
+                    _list = database.get_list_page(name=target, after=after, before=before, limit=CARD_PAGE_SIZE)
                 else:
                     try:
-                        _list.update(database.get_list(name=target))
+                        _list.update(database.get_list_page(name=target, limit=CARD_PAGE_SIZE))
                     except Exception as e:
                         logger.error("%s" % e)
+        if _list:
+            has_more = _list.get('has_more')
         #构建参数列表
         #TODO:zip最大支持5个列表，无法显示purpose属性
         if display_target == 'list':
@@ -173,63 +337,81 @@ def create_message_card_date(
                     for id_, name_, useable_, do_,wis_ in zip(_list['id'], _list['name'], _list['useable'], _list['do'],_list['wis'])] if _list else None
         
         if object_list: #如有相关数据-展示循环容器-勾选器
-            for obj in object_list:
+            if backward:
+                #向前翻页时，超出字节数限制应去掉离当前页最远(最前面)的行
+                object_list.reverse()
+            size = 0
+            columns = zip(format_column((obj['param1'] for obj in object_list), 10),
+                          format_column((obj['param3'] for obj in object_list), 8),
+                          format_column((obj['param2'] for obj in object_list), 12))
+            for index, (obj, (param1, param3, param2)) in enumerate(zip(object_list, columns)):
                 checker_text = (
-                    f"<font color=blue>{format_with_margin(obj['param1'],10)}</font>"
-                    f"<font color=red>{format_with_margin(obj['param3'],8)}</font>"
-                    f"<font color=green>{format_with_margin(obj['param2'],12)}</font>"
+                    f"<font color=blue>{param1}</font>"
+                    f"<font color=red>{param3}</font>"
+                    f"<font color=green>{param2}</font>"
                 )
                 obj['checker_text'] = checker_text
-                repeat_elements = copy.deepcopy(CARD_DISPLAY_REPEAT_ELEMENTS_JSON)
+                repeat_elements = CARD_DISPLAY_REPEAT_ELEMENTS_TEMPLATE.render(obj)
                 
                 if display_target == 'object': #如展示的是物品对象 
                     #额外添加二次确认弹窗-
-                    confirm_data = copy.deepcopy(BUTTON_CONFIRM_JSON)
+                    confirm_data = BUTTON_CONFIRM_TEMPLATE.render(obj)
                     if title_id == '0': #归还操作-设置按键值
                         confirm_data['text']['content'] = f"你是否要归还{obj['name']} oid:{obj['oid']}"
                         repeat_elements['button_area']['buttons'][0]['value']['name']="object.return"
                     else:   #展示物品详细信息-修改按键值为空
-                        confirm_data['text']['content'] = (
-                            f"{obj['name']} oid:{obj['oid']}\n"
-                            f"当前位置:{obj['wis']}\t当前状态:{obj['useable']}\n"
-                            f"备注：{obj['do']}\n")
+                        confirm_data['text']['content'] += "\n"
                         repeat_elements['button_area']['buttons'][0]['value']['name']="none"
                     repeat_elements['button_area']['buttons'][0]['confirm']=confirm_data
                     #同时开启勾选器允许勾选
                     if obj['useable'] == '可用':
                         repeat_elements['disabled']=False
-                    #根据已选中物品信息设置勾选器状态
-                    if str(obj['oid']) in selectedObjectList['oid']:
-                        repeat_elements['checked'] = True
-                #将已选中物品加入到返回值内
-                repeat_elements['button_area']['buttons'][0]['value']['selectedObjectList'] = selectedObjectList
-                repeat_elements['behaviors'][0]['value']['selectedObjectList'] = selectedObjectList
+                    #勾选后停留在当前页
+                    if title_id == '3' and cursor:
+                        repeat_elements['behaviors'][0]['value']['cursor'] = cursor
+                #超出字节数限制时截断(至少保留一行)
+                size += len(ujson.dumps(repeat_elements, ensure_ascii=False).encode())
+                if rows and size > CARD_MAX_BYTES:
+                    if has_more is None:
+                        rows.append((None, {
+                            "tag": "div",
+                            "text": {
+                                "tag": "plain_text",
+                                "content": f"物品过多，仅显示前{index}项",
+                            }
+                        }))
+                    else:
+                        has_more = True
+                        object_list = object_list[:index]
+                    break
                 #添加一行勾选器
-                result_data['elements'].append(replace_placeholders(repeat_elements, obj))
+                rows.append((str(obj['oid']) if 'oid' in obj else None, repeat_elements))
+            if backward:
+                rows.reverse()
+                object_list.reverse()
         else:   #如无相关数据-提示用户
             raise ValueError(f"Error:找不到相关物品")
     except ValueError as e:
-        result_data['elements'].append({
+        rows.append((None, {
             "tag": "div",
             "text": {
                 "tag": "plain_text",
                 "content": f"{e}",
             }
-        })
-    #设置表单容器
-    form_json = copy.deepcopy(FORM_JSON)
-    #显示已选中物品
-    form_json['elements'][1]['content'] = "\n".join(
-        f"{format_with_margin(name,margin=20)}{oid}"
-        for name, oid in zip(selectedObjectList["name"], selectedObjectList["oid"])
-    ) 
-    #返回选中的物品列表
-    form_json['elements'][3]['value']['selectedObjectList'] = selectedObjectList
-    #添加表单容器    
-    result_data['elements'].append(form_json)
-    return result_data
-
-@celery_task
+        }))
+        object_list = None
+
+    #翻页位置
+    prev_cursor = next_cursor = None
+    if has_more is not None and object_list:
+        has_prev, has_next = (has_more, True) if backward else (after is not None, has_more)
+        if has_prev:
+            prev_cursor = f"prev:{object_list[0]['param1']}"
+        if has_next:
+            next_cursor = f"next:{object_list[-1]['param1']}"
+    return {'rows': rows, 'prev': prev_cursor, 'next': next_cursor}
+
+@celery_task(queue="interactive", ignore_result=True)
 def create_approval_about_apply_items(
     user_id: str, 
     selectedObjectList: dict, 
@@ -259,7 +441,7 @@ def create_approval_about_apply_items(
 '''
 user commands
 '''
-@celery_task
+@celery_task(queue="interactive", ignore_result=True)
 def create_command_message_response(
     user_id: str,
     message: dict,
@@ -297,8 +479,9 @@ def create_command_message_response(
         'lsop':     {'command':_command_list_op,         'needed_root':True},
         'search':   {'command':_command_search_id,       'needed_root':False},
         'return':   {'command':_command_return_item,     'needed_root':False},
-        'save':     {'command':_command_save,            'needed_root':True},
-        'load':     {'command':_command_load,            'needed_root':True},
+        'remind':   {'command':_command_remind,          'needed_root':True},
+        'save':     {'command':_command_save,            'needed_root':True, 'bulk':True},
+        'load':     {'command':_command_load,            'needed_root':True, 'bulk':True},
     }
     #目前只能识别文字信息
     if message.get('message_type') != 'text':
@@ -337,13 +520,40 @@ def create_command_message_response(
                         params = {key: value.strip("'") for key, value in pairs}
                     #进行相应操作
                     if not command_map[command]['needed_root'] or database.is_user_root(user_id):
-                        reply_text = command_map[command]['command'](reply_map, message, sender_id, object, params)
+                        if command_map[command].get('bulk'):
+                            #耗时较长的批量操作交给bulk队列，避免阻塞交互任务
+                            run_bulk_command(user_id, command, reply_map, message, sender_id, object, params)
+                        else:
+                            # 指令中的多次写入只使卡片缓存失效一次
+                            with database.batch_writes():
+                                reply_text = command_map[command]['command'](reply_map, message, sender_id, object, params)
                     else:
                         reply_text = reply_map['permission_denied']
     if reply_text not in ('', None) :
         _fs.api.message.send_text_with_user_id(user_id,reply_text)
         logger.info('向 %s 发送消息 %s' % (user_id,reply_text))
 
+@celery_task(queue="bulk", ignore_result=True)
+def run_bulk_command(
+    user_id: str,
+    command: str,
+    reply_map: dict,
+    message: dict,
+    sender_id: dict,
+    object: str | None = None,
+    params: dict | None = None
+):
+    """
+    在bulk队列中执行耗时较长的命令,并将结果发送给用户
+
+    支持的命令放在BULK_COMMAND_MAP内
+    """
+    with database.batch_writes():
+        reply_text = BULK_COMMAND_MAP[command](reply_map, message, sender_id, object, params)
+    if reply_text not in ('', None) :
+        _fs.api.message.send_text_with_user_id(user_id,reply_text)
+        logger.info('向 %s 发送消息 %s' % (user_id,reply_text))
+
 def _command_add_object(reply_map, message, sender_id, object, params):
     """
     (指令)添加物品
@@ -468,7 +678,7 @@ def _command_search_id(reply_map, message, sender_id, object, params):
     #TODO:异常处理
     try:
         user_id = sender_id['user_id']
-        content = create_message_card_date(object_id=int(object))
+        content = create_message_card_date(object_id=int(object), user_id=user_id)
         send_a_new_message_card(user_id, content)
     
         return None
@@ -493,6 +703,23 @@ def _command_return_item(reply_map, message, sender_id, object, params):
     except Exception as e:
         return f"失败 {e}"
 
+def _command_remind(reply_map, message, sender_id, object, params):
+    """
+    (指令)提醒所有持有已借出物品的用户归还物品
+
+    通过批量发送接口发送，参考`app.feishu.notify.broadcast`
+    指令参数参考`_command_get_help`
+    """
+    from ..notify import broadcast
+    user_ids = database.get_borrower_ids()
+    if not user_ids:
+        return '当前没有已借出的物品'
+    text = "请尽快归还借用的物品，可发送 /return {id} 归还"
+    if object:
+        text += f"\n{object}"
+    broadcast(user_ids, text)
+    return f'已提醒 {len(user_ids)} 位用户归还物品'
+
 def _command_save(reply_map, message, sender_id, object, params):
     """
     (指令)存储当前数据库中的物资(详细)信息到电子表格中.
@@ -561,6 +788,12 @@ def _command_load(reply_map, message, sender_id, object, params):
     except Exception as e:
         return f"失败 {e}"
 
+# 在bulk队列中执行的命令
+BULK_COMMAND_MAP = {
+    'save': _command_save,
+    'load': _command_load,
+}
+
 def _command_get_help(reply_map, message, sender_id, object, params):
     """返回指令帮助菜单."""
     margin = 10
@@ -582,6 +815,7 @@ def _command_get_help(reply_map, message, sender_id, object, params):
         f"{'lsop {{@user_name}}':<{margin}} \t列出管理员列表\n"
         f"{'search {{id}}':<{margin}} \t搜索id对应的项\n"
         f"{'return {{id}}':<{margin}} \t归还id对应的物品,只能还自己的，管理员可以帮忙归还\n"
+        f"{'*remind [备注]':<{margin}} \t提醒所有持有已借出物品的用户归还物品\n"
         f"{'save':<{margin}} \t(仅管理员)同步物资情况到指定的电子表格\n"
         f"{'load':<{margin}} \t(仅管理员)同步电子表格中物资情况到数据库\n"
     )
@@ -1,10 +1,28 @@
+import logging
 import os
 import subprocess
 import sys
 import ujson
 from flask import jsonify
+from app.decorators import celery_task
 from app.feishu.config import FEISHU_CONFIG as _fs
-from scripts.utils import get_project_root
+from scripts.utils import dict_2_obj, get_project_root
+
+@celery_task(queue="media", ignore_result=True)
+def gcode_optimize_task(event: dict, uploader_user_id: str):
+    """
+    在media队列中处理gcode文件,并将处理结果发送给上传者
+
+    Args:
+        event: 多维表格记录变更事件的event字段(原始json)
+        uploader_user_id: 上传者user_id
+    """
+    logger = logging.getLogger(__name__)
+    response_str = gcode_optimize_event_handler(logger, dict_2_obj(event))
+    _fs.api.message.send_text_with_user_id(
+        user_id=uploader_user_id,
+        content=response_str,
+    )
 
 def gcode_optimize_event_handler(logger, event):
     try:
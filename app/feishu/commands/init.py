@@ -1,55 +1,28 @@
-import hashlib
 import logging
 from scripts.api.feishu import LarkException
 from ..config import FEISHU_CONFIG as _fs,database,redis_client
 from .projects_group import traverse_threads_and_create_inventories
+from .members import sync_contact_members, is_recently_synced
+from ..web.auth import FeishuException
 logger = logging.getLogger(__name__)
 
 def update_members():
     """更新成员列表.
-    使用`获取通讯录授权范围`api获取用户列表    
-        该api只能获取直属于组织的用户列表，因此需要调整组织架构让目标用户直属于组织;
-        或者 加点代码递归搜索组织下各部门的用户列表
+    对比`获取通讯录授权范围`内的用户(包括授权部门及其子部门下的用户)与数据库中的用户，
+    批量添加、更新、删除有差异的用户，参考`members.sync_contact_members`
     """
     try:
         # 前提：存在数据库
         if not database:
             logger.info("Cannot connect to databse, skip add members from contact.")
-        user_ids = []
-        page_token = None
-        while(True):
-            resp = _fs.api.contact.get_scopes(user_id_type='user_id', page_token=page_token)
-            result = resp
-            user_ids += result.get('data').get('user_ids')
-            page_token = result.get('data').get("page_token")
-            if not page_token:
-                break
-        
-            #校验md5值，检测是否有变化
-            list_string = ''.join(map(str, user_ids))
-            MD5remote = hashlib.md5()
-            MD5remote.update(list_string.encode('utf-8'))
-            MD5remote = MD5remote.hexdigest()
-
-            MD5local = database.fetch_contact_md5()
-
-            if not MD5local != MD5remote:
-                resp = _fs.api.contact.get_users_batch(user_ids=user_ids, user_id_type='user_id')
-                items = resp.get('data').get('items')
-                user_list = list()
-                for item in items:
-                    user_list.append({
-                        'name':item['name'],
-                        'user_id':item['user_id'],
-                        'union_id':item['union_id'],
-                        'open_id':item['open_id']
-                    })
-                database.add_member_batch(user_list)
-                database.update_contact_md5(MD5remote)
-                logger.info("success update members from contact.")
-            else:
-                logger.info("skip add members from contact.")
-    except LarkException as e:
+            return
+        # 通讯录事件会实时同步用户，近期已全量同步过时跳过
+        if is_recently_synced():
+            logger.info("skip update members, contact was synced recently.")
+            return
+        result = sync_contact_members()
+        logger.info("success update members from contact: %s", result)
+    except (LarkException, FeishuException) as e:
         logger.error("failed to update members from contact: %s" % e)
 
 def sub_approval_event(): 
@@ -0,0 +1,158 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from ..config import FEISHU_CONFIG as _fs, database, redis_client
+from .application import card_cache
+from ..open_api import request_open_api
+from ..pagination import paginate, paginate_pages
+
+logger = logging.getLogger(__name__)
+
+# `批量获取用户信息`每次最多50个用户
+CONTACT_BATCH_SIZE = 50
+# 并发请求通讯录接口的线程数
+SYNC_WORKERS = 4
+# 需要保存到数据库的用户字段
+MEMBER_FIELDS = ("user_id", "open_id", "union_id", "name")
+
+# APIContainer中没有部门相关的接口，直接请求开放接口
+DEPARTMENT_CHILDREN_URI = "/open-apis/contact/v3/departments/{}/children"
+USERS_BY_DEPARTMENT_URI = "/open-apis/contact/v3/users/find_by_department"
+# 全量同步的时间记录，有效期内重启服务时不再全量同步(期间的变化由通讯录事件同步)
+LAST_SYNC_KEY = "contact:last_full_sync"
+FULL_SYNC_INTERVAL = 86400
+
+
+def _get_child_departments(department_id: str) -> list[str]:
+    """获取部门下的所有子部门(递归)的open_department_id"""
+    def fetch(page_token=None, **params):
+        if page_token:
+            params["page_token"] = page_token
+        return request_open_api("GET", DEPARTMENT_CHILDREN_URI.format(department_id), params=params)
+
+    return [
+        department["open_department_id"]
+        for department in paginate(fetch, fetch_child="true", page_size=50)
+    ]
+
+
+def _get_department_users(department_id: str) -> list[dict]:
+    """获取直属于部门的用户"""
+    def fetch(page_token=None, **params):
+        if page_token:
+            params["page_token"] = page_token
+        return request_open_api("GET", USERS_BY_DEPARTMENT_URI, params=params)
+
+    return list(paginate(fetch, department_id=department_id, user_id_type="user_id", page_size=50))
+
+
+def _get_users_batch(user_ids: list[str]) -> list[dict]:
+    resp = _fs.api.contact.get_users_batch(user_ids=user_ids, user_id_type="user_id")
+    return resp.get("data").get("items") or []
+
+
+def fetch_contact_members() -> dict[str, dict]:
+    """
+    获取通讯录授权范围内的所有用户
+
+    包括直接授权的用户，以及授权部门及其子部门下的用户
+
+    Return:
+        {user_id: {'user_id', 'open_id', 'union_id', 'name'}}
+    """
+    # 授权范围的每一页同时包含用户和部门，只翻页一次
+    user_ids, department_ids = [], []
+    for data in paginate_pages(_fs.api.contact.get_scopes, user_id_type="user_id"):
+        user_ids += data.get("user_ids") or []
+        department_ids += data.get("department_ids") or []
+
+    with ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="contact") as executor:
+        departments = set(department_ids)
+        for children in executor.map(_get_child_departments, department_ids):
+            departments.update(children)
+
+        chunks = [user_ids[i:i + CONTACT_BATCH_SIZE] for i in range(0, len(user_ids), CONTACT_BATCH_SIZE)]
+        user_futures = [executor.submit(_get_users_batch, chunk) for chunk in chunks]
+        user_futures += [executor.submit(_get_department_users, department) for department in departments]
+
+        members = {}
+        for future in user_futures:
+            for user in future.result():
+                members[user["user_id"]] = {field: user.get(field) for field in MEMBER_FIELDS}
+    logger.info("fetch %d members from %d departments and %d users in contact scope",
+                len(members), len(departments), len(user_ids))
+    return members
+
+
+def diff_members(remote: dict[str, dict], local: list[dict]) -> tuple[list[dict], list[dict], list[str]]:
+    """
+    对比通讯录和数据库中的用户
+
+    Return:
+        (需要添加的用户, 信息有变化的用户, 需要删除的用户的user_id)
+    """
+    local_by_id = {member["user_id"]: member for member in local if member["user_id"]}
+    inserts = [member for user_id, member in remote.items() if user_id not in local_by_id]
+    updates = [
+        member for user_id, member in remote.items()
+        if user_id in local_by_id
+        and any(local_by_id[user_id][field] != member[field] for field in MEMBER_FIELDS)
+    ]
+    deletes = [user_id for user_id in local_by_id if user_id not in remote]
+    return inserts, updates, deletes
+
+
+def sync_contact_members() -> dict:
+    """
+    将通讯录中的用户同步到数据库：添加新用户，更新改名等信息有变化的用户，删除已离开授权范围的用户
+
+    通讯录中没有获取到任何用户时不删除，避免授权配置错误时清空用户表
+
+    Return:
+        {'inserted': 添加数, 'updated': 更新数, 'deleted': 删除数}
+    """
+    remote = fetch_contact_members()
+    inserts, updates, deletes = diff_members(remote, database.get_all_members())
+    if not remote:
+        deletes = []
+    if inserts or updates or deletes:
+        if not database.sync_members(inserts, updates, deletes):
+            raise RuntimeError("failed to write members to database")
+    if updates or deletes:
+        invalidate_member_caches()
+    redis_client.set(LAST_SYNC_KEY, 1, ex=FULL_SYNC_INTERVAL)
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes)}
+
+
+def is_recently_synced() -> bool:
+    """`FULL_SYNC_INTERVAL`内是否执行过全量同步"""
+    return bool(redis_client.exists(LAST_SYNC_KEY))
+
+
+def invalidate_member_caches():
+    """用户改名或被删除后，使依赖用户名的缓存(消息卡片中的"我的物品"等)失效"""
+    card_cache.invalidate()
+
+
+def upsert_contact_member(user: dict):
+    """
+    通讯录中新增或修改用户时(`contact.user.created_v3`/`updated_v3`)更新数据库中的用户
+
+    Args:
+        user: 事件中的用户信息
+    """
+    member = {field: user.get(field) for field in MEMBER_FIELDS}
+    if not member["user_id"]:
+        logger.warning("contact user event without user_id, open_id:%s", member["open_id"])
+        return
+    if not database.upsert_member(member):
+        logger.error("failed to upsert contact member, user_id:%s", member["user_id"])
+        return
+    invalidate_member_caches()
+
+
+def delete_contact_member(user: dict):
+    """通讯录中删除用户时(`contact.user.deleted_v3`)删除数据库中的用户"""
+    if user.get("user_id"):
+        database.delete_member(user["user_id"])
+        invalidate_member_caches()
@@ -1,118 +1,213 @@
 import logging
+import time
 import ujson
+from concurrent.futures import ThreadPoolExecutor
 from ..config import FEISHU_CONFIG as _fs
+from ..config import redis_client
 from scripts.utils import safe_get
+from ..pagination import paginate
 
 logger = logging.getLogger(__name__)
 
 ADMIN_CONFIG = _fs.admin_config
 PROJECT_CHAT_ID = _fs.projects_management.chat_id
+# 话题群成员的user_id集合，首次使用时从接口获取，之后由进群/退群事件更新
+CHAT_MEMBERS_KEY = f"chat:{PROJECT_CHAT_ID}:members"
+# 已处理到的最后一个主题的创建时间(毫秒)，同步时只处理之后的主题
+THREADS_CURSOR_KEY = f"chat:{PROJECT_CHAT_ID}:threads_cursor"
+# 已存在的任务清单名集合，首次同步时从接口获取
+INVENTORY_NAMES_KEY = "task:inventory_names"
+# 并发创建任务清单的线程数
+SYNC_WORKERS = getattr(_fs.projects_management, "sync_workers", 4)
+SYNC_RETRIES = 3
+
+# 集合存在时才添加元素，集合不存在时下次读取会重新获取完整的列表
+_sadd_if_exists = redis_client.register_script("""
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('SADD', KEYS[1], unpack(ARGV))
+end
+return 0
+""")
+
+
+def _get_all_threads(start_time: int | None = None):
+    """
+    获取所有主题(逐条返回)
 
-
-def _get_all_threads():
-    """获取所有主题"""
-    page_token = None
-    thread_list = []
-    while True:
-        resp = _fs.api.message.list(
-            container_id_type="chat",
-            container_id=PROJECT_CHAT_ID,
-            page_size=50,
-            page_token=page_token,
-        )
-        _list = safe_get(resp, "data", "items")
-        if _list:
-            thread_list.extend(_list)
-        page_token = safe_get(resp, "data", "page_token")
-        if not page_token:
-            break
-    return thread_list
+    Args:
+        start_time: 只获取该时间(秒)之后创建的主题
+    """
+    params = {"start_time": str(start_time)} if start_time else {}
+    return paginate(
+        _fs.api.message.list,
+        container_id_type="chat",
+        container_id=PROJECT_CHAT_ID,
+        page_size=50,
+        **params,
+    )
 
 
 def _get_all_chat_members(member_id_type: str = "user_id"):
-    """获取群组成员列表"""
-    chat_member_list = []
-    page_token = None
-    while True:
-        resp = _fs.api.chat.get_members(
-            chat_id=PROJECT_CHAT_ID,
-            member_id_type=member_id_type,
-            page_size=50,
-            page_token=page_token,
-        )
-        page_token = safe_get(resp, "data", "page_token")
-        chat_member_list.extend(safe_get(resp, "data", "items"))
-        if not page_token:
-            break
-    return chat_member_list
+    """获取群组成员列表(逐条返回)"""
+    return paginate(
+        _fs.api.chat.get_members,
+        chat_id=PROJECT_CHAT_ID,
+        member_id_type=member_id_type,
+        page_size=50,
+    )
 
 
 def _get_all_inventories():
-    """获取所有任务清单"""
-    page_token = None
-    inventory_list = []
-    while True:
-        resp = _fs.api.task.get_inventory_list()
-        _list = safe_get(resp, "data", "items")
-        if _list:
-            inventory_list.extend(_list)
-        page_token = safe_get(resp, "data", "page_token")
-        if not page_token:
-            break
-    return inventory_list
+    """获取所有任务清单(逐条返回)"""
+    return paginate(_fs.api.task.get_inventory_list)
+
+
+def seed_chat_members(user_ids=None) -> list[str]:
+    """
+    用完整的成员列表重建话题群成员集合
+
+    Args:
+        user_ids: 成员user_id列表，为None时从接口获取
+    """
+    if user_ids is None:
+        user_ids = [member["member_id"] for member in _get_all_chat_members(member_id_type="user_id")]
+    pipe = redis_client.pipeline()
+    pipe.delete(CHAT_MEMBERS_KEY)
+    if user_ids:
+        pipe.sadd(CHAT_MEMBERS_KEY, *user_ids)
+    pipe.execute()
+    return list(user_ids)
+
+
+def get_chat_member_ids() -> list[str]:
+    """获取话题群成员的user_id列表，集合不存在时从接口获取"""
+    user_ids = redis_client.smembers(CHAT_MEMBERS_KEY)
+    if user_ids:
+        return [user_id.decode() for user_id in user_ids]
+    return seed_chat_members()
+
+
+def add_chat_members(user_ids: list[str]):
+    """成员进群(`im.chat.member.user.added_v1`)"""
+    if user_ids:
+        _sadd_if_exists(keys=[CHAT_MEMBERS_KEY], args=user_ids)
+
+
+def remove_chat_members(user_ids: list[str]):
+    """成员退群或被移出群(`im.chat.member.user.deleted_v1`)，以及拉人进群被撤销(`withdrawn_v1`)"""
+    if user_ids:
+        redis_client.srem(CHAT_MEMBERS_KEY, *user_ids)
 
 
 def delete_all_inventories():
     """!危险 删除所有任务清单"""
-    inventory_list = _get_all_inventories()
+    # 先取出全部清单再删除，避免删除过程中翻页错位
+    inventory_list = list(_get_all_inventories())
     for item in inventory_list:
         _fs.api.task.delete_task_inventory(item["guid"])
+    redis_client.delete(INVENTORY_NAMES_KEY, THREADS_CURSOR_KEY)
 
 
-def traverse_threads_and_create_inventories():
-    """(初始化)遍历话题群消息，建立相对应的任务清单"""
+def get_inventory_names() -> set[str]:
+    """获取已存在的任务清单名，集合不存在时从接口获取"""
+    names = redis_client.smembers(INVENTORY_NAMES_KEY)
+    if names:
+        return {name.decode() for name in names}
+    names = {item["name"] for item in _get_all_inventories()}
+    pipe = redis_client.pipeline()
+    pipe.delete(INVENTORY_NAMES_KEY)
+    if names:
+        pipe.sadd(INVENTORY_NAMES_KEY, *names)
+    pipe.execute()
+    return names
 
-    # 获取群组成员user_id列表
-    chat_member_list = _get_all_chat_members(member_id_type="user_id")
-    chat_members_user_id_list = [member["member_id"] for member in chat_member_list]
 
-    # 获取管理员user_id列表
-    admin_user_id_list = _fs.admin_config.user_id_list
+def _add_inventory_name(name: str):
+    _sadd_if_exists(keys=[INVENTORY_NAMES_KEY], args=[name])
 
-    # 获取所有主题
-    thread_list = _get_all_threads()
 
-    # 获取已存在的所有任务清单名
-    inventory_list = _get_all_inventories()
-    existed_inventory_name = [item["name"] for item in inventory_list]
+def _create_thread_inventory(inventory_name: str, creator_open_id: str, members: list[dict]):
+    """
+    创建主题对应的任务清单，并将主题创建者设为编辑者
 
-    # 创建任务清单,设置全体话题群成员为编辑者
-    for thread in thread_list:
+    创建清单不是幂等的，只由限流层重试频率限制；添加成员失败时重试
+    """
+    resp = _fs.api.task.create_inventory(name=inventory_name, members=members)
+    _add_inventory_name(inventory_name)
+    guid = safe_get(resp, "data", "tasklist", "guid")
+    for attempt in range(SYNC_RETRIES):
         try:
-            content = ujson.loads(thread["body"]["content"])
-            creator_open_id = thread["sender"]["id"]
-            inventory_name = safe_get(content, "content", 0, 0, "text")
+            _fs.api.task.add_inventory_member(
+                guid=guid,
+                members=[{"id": creator_open_id, "role": "editor"}],
+                user_id_type="open_id",
+            )
+            break
+        except Exception as e:
+            if attempt == SYNC_RETRIES - 1:
+                logger.error("添加任务清单 %s 的编辑者失败: %s", inventory_name, e)
+            else:
+                time.sleep(2 ** attempt)
+    logger.info("add task inventory %s", inventory_name)
 
-            if inventory_name != None and inventory_name not in existed_inventory_name:
-                resp = _fs.api.task.create_inventory(
-                    name=inventory_name,
-                    members=[
-                        {"id": user_id, "role": "viewer"}
-                        for user_id in chat_members_user_id_list
-                    ]
-                    + [
-                        {"id": user_id, "role": "editor"}
-                        for user_id in admin_user_id_list
-                    ],
-                )
-                _fs.api.task.add_inventory_member(
-                    guid=safe_get(resp, "data", "tasklist", "guid"),
-                    members=[{"id": creator_open_id, "role": "editor"}],
-                    user_id_type="open_id",
-                )
-                logger.info("add task inventory %s" % inventory_name)
-        except ujson.JSONDecodeError:
-            pass
+def traverse_threads_and_create_inventories():
+    """
+    (初始化)遍历话题群消息，建立相对应的任务清单
+
+    只处理上次同步之后的新主题，任务清单并发创建(`SYNC_WORKERS`)。
+    某个主题创建失败时，游标停在该主题之前，下次同步时重新处理
+    """
+
+    # 获取上次同步之后的主题
+    cursor = int(redis_client.get(THREADS_CURSOR_KEY) or 0)
+    thread_list = sorted(
+        (thread for thread in _get_all_threads(start_time=cursor // 1000 or None)
+         if int(thread.get("create_time", 0)) > cursor),
+        key=lambda thread: int(thread["create_time"]),
+    )
+    if not thread_list:
+        logger.info("no new threads since %s", cursor)
+        return
+
+    # 获取群组成员user_id列表(redis中的成员集合，由进群/退群事件保持更新)和管理员user_id列表
+    chat_members_user_id_list = get_chat_member_ids()
+    admin_user_id_list = _fs.admin_config.user_id_list
+    members = [
+        {"id": user_id, "role": "viewer"}
+        for user_id in chat_members_user_id_list
+    ] + [
+        {"id": user_id, "role": "editor"}
+        for user_id in admin_user_id_list
+    ]
+
+    # 获取已存在的所有任务清单名
+    existed_inventory_name = get_inventory_names()
+
+    # 创建任务清单,设置全体话题群成员为查看者
+    futures = []
+    with ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="inventory") as executor:
+        for thread in thread_list:
+            try:
+                content = ujson.loads(thread["body"]["content"])
+            except ujson.JSONDecodeError:
+                futures.append((thread, None))
+                continue
+            inventory_name = safe_get(content, "content", 0, 0, "text")
+            if inventory_name is None or inventory_name in existed_inventory_name:
+                futures.append((thread, None))
+                continue
+            # 同一次同步中重名的主题只创建一次
+            existed_inventory_name.add(inventory_name)
+            futures.append((thread, executor.submit(
+                _create_thread_inventory, inventory_name, thread["sender"]["id"], members)))
+
+    # 游标推进到第一个失败的主题之前
+    for thread, future in futures:
+        if future is not None and future.exception():
+            logger.error("创建主题 %s 的任务清单失败: %s", thread.get("message_id"), future.exception())
+            break
+        cursor = int(thread["create_time"])
+    redis_client.set(THREADS_CURSOR_KEY, cursor)
 
 
 def new_thread_in_project_group_callback(message: str):
@@ -120,8 +215,7 @@ def new_thread_in_project_group_callback(message: str):
     检测到话题群内新建话题时触发，新建任务
     """
     # 获取群组成员user_id列表
-    chat_member_list = _get_all_chat_members(member_id_type="user_id")
-    chat_members_user_id_list = [member["member_id"] for member in chat_member_list]
+    chat_members_user_id_list = get_chat_member_ids()
 
     # 创建任务清单,设置全体话题群成员为编辑者
     content = ujson.loads(message["content"])
@@ -134,4 +228,5 @@ def new_thread_in_project_group_callback(message: str):
                 for user_id in chat_members_user_id_list
             ],
         )
+        _add_inventory_name(inventory_name)
         logger.info("add task inventory %s" % inventory_name)
@@ -2,14 +2,20 @@ from app import app
 
 from scripts.api.feishu import APIContainer
 from scripts.utils import dict_2_obj
+from .api_scheduler import RateLimitedAPI
 
 database = app.config.get("database")
 redis_client = app.config.get('redis_client')
+request_capture = app.config.get("request_capture")
 feishu_config = app.config.get("feishu")
 # 飞书参数及api
 FEISHU_CONFIG = dict_2_obj(feishu_config)
-FEISHU_CONFIG.api = APIContainer(
-    FEISHU_CONFIG.APP_ID,
-    FEISHU_CONFIG.APP_SECRET,
-    FEISHU_CONFIG.LARK_HOST,
+# 所有飞书接口调用经过限流、重试和熔断
+FEISHU_CONFIG.api = RateLimitedAPI(
+    APIContainer(
+        FEISHU_CONFIG.APP_ID,
+        FEISHU_CONFIG.APP_SECRET,
+        FEISHU_CONFIG.LARK_HOST,
+    ),
+    feishu_config.get("api_limit"),
 )
@@ -2,25 +2,34 @@ import ujson
 import logging
 import os
 import subprocess
+import time
 
 from flask import jsonify,request,Blueprint
 from requests import HTTPError
 
 from .config import database
 from .config import redis_client
+from .config import request_capture
 from .config import FEISHU_CONFIG as _fs
 from .commands.application import (
     create_command_message_response,
     create_message_card_date,
     send_a_new_message_card,
-    update_message_card,
-    create_approval_about_apply_items
+    request_card_update,
+    create_approval_about_apply_items,
+    CART_TTL
 )
-from .commands.projects_group import new_thread_in_project_group_callback
+from .commands.projects_group import (
+    new_thread_in_project_group_callback,
+    add_chat_members,
+    remove_chat_members
+)
+from .commands.members import upsert_contact_member, delete_contact_member
+from .cart import SelectionCart
 from app.decorators import rate_limit
+from app.ext.logger import log_context, bind_log_context, log_duration
 from scripts.utils import (
     obj_2_dict,
-    DEBUG_OUT,
     safe_get,
     get_project_root
 )
@@ -74,26 +83,31 @@ def callback_event_handler():
         假如redis内有重复id的事件/回调,认为该请求已处理,返回200空响应
         假如redis中没相应数据,存储,并跳转到event_manager获取到事件/回调对应的处理函数
     """
+    start = time.perf_counter()
     requests = request.json
-    DEBUG_OUT(requests)
+    request_capture.capture("feishu.subscribe", requests)
     timestamp = safe_get(requests,'event','timestamp')
+    event_id = None
     if requests.get('uuid'):  #回调
-        logger.info("fetch request,uuid:%s, timestamp:%s" % (requests['uuid'], timestamp))
+        logger.info("fetch request,uuid:%s, timestamp:%s", requests['uuid'], timestamp)
     elif requests.get("event"): #事件
         event_id = safe_get(requests,'header','event_id')
         create_time = safe_get(requests,'header','create_time')
-        logger.info("fetch event,event_id:%s, timestamp:%s" % (event_id, timestamp))
-        DEBUG_OUT(requests)
+        logger.info("fetch event,event_id:%s, timestamp:%s", event_id, timestamp)
         #使用redis监测重复请求
         if redis_client:
             if redis_client.exists(event_id): #请求已处理，跳过
-                logger.error("This event has been handled. event_id:%s" % event_id)
+                logger.error("This event has been handled. event_id:%s", event_id)
                 return jsonify()
             else:
                 redis_client.set(event_id, create_time, ex=3600)
     event_handler, event = event_manager.get_handler_with_event(_fs.VERIFICATION_TOKEN, _fs.ENCRYPT_KEY)
-    # 运行协程并返回响应
-    return event_handler(event)
+    handler_name = getattr(event_handler, "__name__", None)
+    with log_context(event_id=event_id or requests.get('uuid'), handler=handler_name):
+        # 运行协程并返回响应
+        response = event_handler(event)
+        log_duration(logger.logger, f"handled by {handler_name}", start)
+    return response
 
 @events_bp.errorhandler
 def msg_error_handler(ex):
@@ -123,7 +137,8 @@ def message_receive_event_handler(req_data: MessageReceiveEvent):
     chat_id = req_data.event.message.chat_id
     chat_type = req_data.event.message.chat_type
     message_type = req_data.event.message.message_type
-    logger.info("chat_id:%s,\n\tsender_user_id:%s, chat_type:%s,message:\n\t%s" % (chat_id, chat_type, sender_user_id, message))
+    bind_log_context(user_id=sender_user_id)
+    logger.info("chat_id:%s,\n\tsender_user_id:%s, chat_type:%s,message:\n\t%s", chat_id, chat_type, sender_user_id, message)
     if chat_type == "p2p":
         sender_id = obj_2_dict(req_data.event.sender.sender_id)
         create_command_message_response(user_id=sender_user_id,message=message,sender_id=sender_id)
@@ -139,7 +154,63 @@ def message_recalled_event_handler(req_data: MessageReceiveEvent):
     event = req_data.event
     chat_id = event.chat_id
     message_id = event.message_id
-    logger.info("in chat_id:%s, message_id:%s was recalled" % (chat_id,message_id))
+    logger.info("in chat_id:%s, message_id:%s was recalled", chat_id, message_id)
+    return jsonify()
+
+@event_manager.register("im.chat.member.user.added_v1")
+def chat_member_added_event_handler(req_data):
+    """事件 用户进群-`im.chat.member.user.added_v1`的具体处理，更新话题群成员集合"""
+    event = req_data.event
+    if event.chat_id == PROJECT_CHAT_ID:
+        user_ids = [user.user_id.user_id for user in event.users]
+        logger.info("users:%s joined chat_id:%s", user_ids, event.chat_id)
+        add_chat_members(user_ids)
+    return jsonify()
+
+@event_manager.register("im.chat.member.user.deleted_v1")
+def chat_member_deleted_event_handler(req_data):
+    """事件 用户出群(主动退群或被移出群)-`im.chat.member.user.deleted_v1`的具体处理，更新话题群成员集合"""
+    _remove_project_chat_members(req_data.event)
+    return jsonify()
+
+@event_manager.register("im.chat.member.user.withdrawn_v1")
+def chat_member_withdrawn_event_handler(req_data):
+    """
+    事件 撤销拉用户进群-`im.chat.member.user.withdrawn_v1`的具体处理，更新话题群成员集合
+
+    邀请被撤销时被邀请的用户不会留在群内，但可能已由进群事件加入集合，这里将其移除
+    """
+    _remove_project_chat_members(req_data.event)
+    return jsonify()
+
+def _remove_project_chat_members(event):
+    if event.chat_id == PROJECT_CHAT_ID:
+        user_ids = [user.user_id.user_id for user in event.users]
+        logger.info("users:%s removed from chat_id:%s", user_ids, event.chat_id)
+        remove_chat_members(user_ids)
+
+@event_manager.register("contact.user.created_v3")
+def contact_user_created_event_handler(req_data):
+    """事件 员工入职-`contact.user.created_v3`的具体处理，添加用户"""
+    user = obj_2_dict(req_data.event.object)
+    logger.info("contact user created, user_id:%s", user.get("user_id"))
+    upsert_contact_member(user)
+    return jsonify()
+
+@event_manager.register("contact.user.updated_v3")
+def contact_user_updated_event_handler(req_data):
+    """事件 员工信息变化-`contact.user.updated_v3`的具体处理，更新用户"""
+    user = obj_2_dict(req_data.event.object)
+    logger.info("contact user updated, user_id:%s", user.get("user_id"))
+    upsert_contact_member(user)
+    return jsonify()
+
+@event_manager.register("contact.user.deleted_v3")
+def contact_user_deleted_event_handler(req_data):
+    """事件 员工离职-`contact.user.deleted_v3`的具体处理，删除用户"""
+    user = obj_2_dict(req_data.event.object)
+    logger.info("contact user deleted, user_id:%s", user.get("user_id"))
+    delete_contact_member(user)
     return jsonify()
 
 @event_manager.register("application.bot.menu_v6")
@@ -150,13 +221,22 @@ def bot_mene_click_event_handler(req_data: BotMenuClickEvent):
     """
     user_id = req_data.event.operator.operator_id.user_id
     event_key = req_data.event.event_key
-    logger.info("user_id:%s, event_key:%s" % (user_id, event_key))
+    bind_log_context(user_id=user_id)
+    logger.info("user_id:%s, event_key:%s", user_id, event_key)
     if event_key == 'custom_menu.inspect.items':
     #获取全部物品类型，配置映射
-        content = create_message_card_date(object_id=0)
+        content = create_message_card_date(object_id=0, user_id=user_id)
         send_a_new_message_card(user_id, content)
     return jsonify()
 
+def _get_cart(user_id: str, value) -> SelectionCart:
+    """
+    获取卡片按钮返回值中cart_id对应的已选中物品列表
+
+    旧版本的卡片中没有cart_id，此时新建一个空列表
+    """
+    return SelectionCart(redis_client, user_id, getattr(value, 'cart_id', None), ttl=CART_TTL)
+
 @event_manager.register("card.action.trigger")
 def card_action_event_handler(req_data: CardActionEvent):
     """
@@ -169,7 +249,8 @@ def card_action_event_handler(req_data: CardActionEvent):
     current_card_id = event.context.open_message_id
     tag = event.action.tag
     toast = None
-    logger.info("user_id:%s, tag:%s, card_id:%s" % (user_id, tag, current_card_id))
+    bind_log_context(user_id=user_id)
+    logger.info("user_id:%s, tag:%s, card_id:%s", user_id, tag, current_card_id)
 
     if alife_card_id and alife_card_id!=current_card_id:
         logger.info("The card is too old, try to recall it.")
@@ -181,9 +262,10 @@ def card_action_event_handler(req_data: CardActionEvent):
     else:
         if tag == 'button':
             value = event.action.value
-            selectedObjectList=value.selectedObjectList.__dict__
+            cart = _get_cart(user_id, value)
             #将表单按钮与其余按钮进行区分
             if hasattr(event.action,"name") and event.action.name == "form_button":
+                selectedObjectList = cart.get_selected_object_list()
                 #判断是否选中物品
                 if not selectedObjectList['oid']:
                     toast = {
@@ -197,12 +279,10 @@ def card_action_event_handler(req_data: CardActionEvent):
                             item_info = database.get_item(oid)
                             if item_info['useable'][0] != '可用':
                                 unuseableObjectOid.append(oid)
-                                #删除该物品
-                                index = selectedObjectList['oid'].index(oid)
-                                del selectedObjectList['name'][index]
-                                del selectedObjectList['oid'][index]
                     
                     if unuseableObjectOid:#存在不可用的物品，告诉用户
+                            #删除这些物品
+                            cart.remove(*unuseableObjectOid)
                             toast = {
                                 'type':'error',
                                 'content':f'Error: 物品不可用,oid{unuseableObjectOid}'
@@ -211,49 +291,47 @@ def card_action_event_handler(req_data: CardActionEvent):
                     else: #发送审批申请
                         create_approval_about_apply_items(user_id, selectedObjectList, event.action.form_value.Input_value)
                         #清空选中物品列表
-                        selectedObjectList = None
+                        cart.clear()
                         toast = {
                                 'type':'success',
                                 'content':'success: 已发送申请'
                             }                    
-                    update_message_card(token, object_id=0, selectedObjectList=selectedObjectList)
+                    request_card_update(current_card_id, token, object_id=0, user_id=user_id, cart_id=cart.cart_id)
             else:
                 if value.name == 'home':
-                    update_message_card(token, object_id=0, selectedObjectList=selectedObjectList)
+                    request_card_update(current_card_id, token, object_id=0, user_id=user_id, cart_id=cart.cart_id)
                 elif value.name == 'self':
-                    update_message_card(token, object_id=-1, user_id=user_id, selectedObjectList=selectedObjectList)
+                    request_card_update(current_card_id, token, object_id=-1, user_id=user_id, cart_id=cart.cart_id)
                 elif value.name == 'object.inspect':
-                    update_message_card(token, object_id=int(value.id), selectedObjectList=selectedObjectList)
+                    request_card_update(current_card_id, token, object_id=int(value.id), user_id=user_id, cart_id=cart.cart_id)
+                elif value.name == 'page':
+                    request_card_update(current_card_id, token, object_id=int(value.id), user_id=user_id, target=value.target or None,
+                                        cart_id=cart.cart_id, cursor=value.cursor)
                 elif value.name == 'back':
                     if int(value.id) != 0: #主页时的返回按钮不可用
-                        update_message_card(token, object_id=int(value.id)//1000, selectedObjectList=selectedObjectList)                        
+                        request_card_update(current_card_id, token, object_id=int(value.id)//1000, user_id=user_id, cart_id=cart.cart_id)                        
                 elif value.name == 'object.return':
                     toast = {
                         'type':'success',
                         'content':'success: 已归还'
                     }
                     database.return_item(user_id,value.object_param_1)
-                    update_message_card(token, object_id=-1, user_id=user_id, selectedObjectList=selectedObjectList)
+                    request_card_update(current_card_id, token, object_id=-1, user_id=user_id, cart_id=cart.cart_id)
         elif tag == 'input':
             input_value = event.action.input_value
-            selectedObjectList = event.action.value.selectedObjectList.__dict__
+            cart = _get_cart(user_id, event.action.value)
             
             if event.action.name == "input.search":
-                update_message_card(token, object_id=-2, target=input_value, selectedObjectList=selectedObjectList)
+                request_card_update(current_card_id, token, object_id=-2, user_id=user_id, target=input_value, cart_id=cart.cart_id)
         elif tag == 'checker':
             checked = event.action.checked
-            selectedObjectList = event.action.value.selectedObjectList.__dict__
+            cart = _get_cart(user_id, event.action.value)
             if checked:
-                selectedObjectList['name'].append(event.action.value.name)
-                selectedObjectList['oid'].append(event.action.value.oid)
+                cart.add(event.action.value.oid, event.action.value.name)
             else:
-                try:
-                    index = selectedObjectList['oid'].index(event.action.value.oid)
-                    del selectedObjectList['name'][index]
-                    del selectedObjectList['oid'][index]
-                except ValueError:
-                    pass
-            update_message_card(token, object_id=int(event.action.value.oid)//1000, selectedObjectList=selectedObjectList)
+                cart.remove(event.action.value.oid)
+            request_card_update(current_card_id, token, object_id=int(event.action.value.oid)//1000, user_id=user_id, cart_id=cart.cart_id,
+                                cursor=getattr(event.action.value, 'cursor', None))
 
 
     request_data = {
@@ -311,11 +389,7 @@ def approval_instance_event_handler(req_data: BitableRecordInstanceEvent):
             uploader = next(i.field_identity_value.users[0] for i in event.action_list[0].after_value if i.field_id == uploader_field_id)
             uploader_user_id = uploader.user_id.user_id
             uploader_name = uploader.name
-            response_str = bitables.gcode_optimize_event_handler(logger, event)
-            _fs.api.message.send_text_with_user_id(
-                user_id=uploader_user_id,
-                content=response_str,
-            )
+            bitables.gcode_optimize_task(request.json.get('event'), uploader_user_id)
     return jsonify()
 
 @event_manager.register("drive.file.bitable_field_changed_v1")
@@ -0,0 +1,118 @@
+import logging
+from collections import defaultdict
+
+import ujson
+
+from app.decorators import celery_task
+from .config import FEISHU_CONFIG as _fs, database, redis_client
+from .open_api import request_open_api
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CONFIG = getattr(_fs, "notify", None)
+# 合并同一用户消息的时间窗口(秒)
+DIGEST_WINDOW = getattr(NOTIFY_CONFIG, "digest_window", 5)
+# `批量发送消息`每次最多200个用户
+BATCH_SIZE = getattr(NOTIFY_CONFIG, "batch_size", 200)
+BATCH_SEND_URI = "/open-apis/message/v4/batch_send/"
+
+PENDING_KEY = "notify:pending"
+FLUSH_KEY = "notify:flush_scheduled"
+QUEUE_TTL = 86400
+
+
+def _queue_key(user_id: str) -> str:
+    return f"notify:queue:{user_id}"
+
+
+def notify_users(user_ids: list[str], text: str):
+    """
+    向用户发送文本通知
+
+    消息先放入redis中每个用户的队列，`DIGEST_WINDOW`秒后由`flush_notifications`合并发送：
+    同一用户在窗口内的多条消息合并为一条，内容相同的用户通过批量发送接口一起发送
+    """
+    user_ids = list(dict.fromkeys(user_id for user_id in user_ids if user_id))
+    if not user_ids:
+        return
+    pipe = redis_client.pipeline()
+    for user_id in user_ids:
+        pipe.rpush(_queue_key(user_id), text)
+        pipe.expire(_queue_key(user_id), QUEUE_TTL)
+    pipe.sadd(PENDING_KEY, *user_ids)
+    pipe.execute()
+    # 窗口内只安排一次发送
+    if redis_client.set(FLUSH_KEY, 1, nx=True, ex=DIGEST_WINDOW * 10):
+        flush_notifications()
+
+
+def notify_admins(text: str):
+    """向管理员(settings.json中的admin_config.user_id_list及数据库中的管理员)发送通知"""
+    user_ids = list(_fs.admin_config.user_id_list)
+    user_ids += [member['user_id'] for member in database.get_members_root()]
+    notify_users(user_ids, text)
+
+
+@celery_task(queue="interactive", ignore_result=True, countdown=DIGEST_WINDOW)
+def flush_notifications():
+    """发送所有等待中的通知，参考`notify_users`"""
+    # 先清除标记，发送期间的新消息会安排下一次发送
+    redis_client.delete(FLUSH_KEY)
+    digests = defaultdict(list)
+    while True:
+        user_ids = redis_client.spop(PENDING_KEY, 500)
+        if not user_ids:
+            break
+        pipe = redis_client.pipeline()
+        for user_id in user_ids:
+            pipe.lrange(_queue_key(user_id.decode()), 0, -1)
+            pipe.delete(_queue_key(user_id.decode()))
+        results = pipe.execute()
+        for user_id, messages in zip(user_ids, results[::2]):
+            if messages:
+                digests["\n\n".join(m.decode() for m in messages)].append(user_id.decode())
+    for text, recipients in digests.items():
+        _send_text(recipients, text)
+
+
+@celery_task(queue="bulk", ignore_result=True)
+def broadcast(user_ids: list[str], text: str):
+    """
+    立即向多个用户发送同一条文本消息(不合并)，如`/remind`指令提醒归还物品
+
+    每`BATCH_SIZE`个用户调用一次批量发送接口
+    """
+    _send_text(list(dict.fromkeys(user_ids)), text)
+
+
+def _request_batch_send(user_ids: list[str], text: str) -> dict:
+    return request_open_api("POST", BATCH_SEND_URI, json={
+        "msg_type": "text",
+        "content": {"text": text},
+        "user_ids": user_ids,
+    })
+
+
+# 经过限流层，与其他消息接口共用频率限制和熔断状态；
+# 非只读接口只在触发频率限制(请求未被处理)时重试，不会重复发送
+_batch_send = _fs.api.wrap("message", "batch_send", _request_batch_send)
+
+
+def _send_text(user_ids: list[str], text: str):
+    """单个用户使用普通发送接口，多个用户使用批量发送接口"""
+    if len(user_ids) == 1:
+        try:
+            _fs.api.message.send_text_with_user_id(user_ids[0], text)
+        except Exception as e:
+            logger.error("向 %s 发送通知失败: %s", user_ids[0], e)
+        return
+    for i in range(0, len(user_ids), BATCH_SIZE):
+        chunk = user_ids[i:i + BATCH_SIZE]
+        try:
+            result = _batch_send(chunk, text)
+            invalid = (result.get("data") or {}).get("invalid_user_ids")
+            if invalid:
+                logger.warning("批量发送通知时无效的用户: %s", invalid)
+            logger.info("批量发送通知给 %d 个用户", len(chunk))
+        except Exception as e:
+            logger.error("批量发送通知失败: %s, user_ids: %s", e, ujson.dumps(chunk))
@@ -0,0 +1,33 @@
+from .config import FEISHU_CONFIG as _fs, redis_client
+from .web.auth import Auth
+from app.ext.http_session import DEFAULT_HTTP_CONFIG, get_session
+
+# APIContainer中没有的接口直接请求开放接口，tenant_access_token与网页应用共用缓存
+_auth = Auth(_fs.LARK_HOST, _fs.APP_ID, _fs.APP_SECRET, redis_client)
+# 开放接口的session固定只对幂等请求重试(不受settings.json中http.retry_methods影响)，
+# 发送消息等POST请求在服务端返回5xx时不重试，避免重复发送
+OPEN_API_SESSION = "open_api"
+OPEN_API_RETRY_METHODS = DEFAULT_HTTP_CONFIG["retry_methods"]
+
+
+def request_open_api(method: str, uri: str, **kwargs) -> dict:
+    """
+    请求飞书开放接口
+
+    Args:
+        method: 请求方法
+        uri: 接口地址，如`/open-apis/contact/v3/users/find_by_department`
+        **kwargs: 传给`requests.Session.request`的参数(params、json等)
+
+    raise:
+        FeishuException: 飞书返回错误码时抛出
+    """
+    _auth.authorize_tenant_access_token()
+    resp = get_session(OPEN_API_SESSION, retry_methods=OPEN_API_RETRY_METHODS).request(
+        method,
+        _fs.LARK_HOST + uri,
+        headers={"Authorization": "Bearer " + _auth.tenant_access_token},
+        **kwargs,
+    )
+    Auth._check_error_response(resp)
+    return resp.json()
@@ -0,0 +1,92 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+
+from scripts.utils import safe_get
+
+logger = logging.getLogger(__name__)
+
+
+def paginate_pages(
+    fetch: Callable,
+    prefetch: bool = True,
+    is_last: Callable[[dict], bool] | None = None,
+    **params
+) -> Iterator[dict]:
+    """
+    逐页返回飞书分页接口响应中的`data`，用于同一页中有多个数据列表的接口(如`get_scopes`)
+
+    调用方处理当前页时，在后台线程中预先请求下一页；调用方提前退出循环时不再请求。
+
+    Args:
+        fetch: 飞书接口，需要接受page_token参数
+        prefetch: 是否预先请求下一页
+        is_last: 判断当前页是否为最后需要的一页，返回True时不再请求下一页
+        **params: 传给fetch的其他参数
+
+    Example:
+        for data in paginate_pages(_fs.api.contact.get_scopes, user_id_type="user_id"):
+            user_ids += data.get("user_ids") or []
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="paginate") if prefetch else None
+    try:
+        page_token = None
+        resp = fetch(page_token=page_token, **params)
+        while True:
+            data = safe_get(resp, "data") or {}
+            next_token = safe_get(data, "page_token")
+            if safe_get(data, "has_more") is False:
+                next_token = None
+            if next_token and next_token == page_token:
+                logger.warning("%s 返回了相同的page_token，停止翻页", getattr(fetch, "__name__", fetch))
+                next_token = None
+            if is_last and is_last(data):
+                next_token = None
+            future = executor.submit(fetch, page_token=next_token, **params) if executor and next_token else None
+
+            yield data
+            if not next_token:
+                return
+            page_token = next_token
+            resp = future.result() if future else fetch(page_token=page_token, **params)
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def paginate(
+    fetch: Callable,
+    items_key: str = "items",
+    max_items: int | None = None,
+    prefetch: bool = True,
+    **params
+) -> Iterator:
+    """
+    逐条返回飞书分页接口的数据
+
+    调用方处理当前页时，在后台线程中预先请求下一页；达到max_items或调用方提前退出循环时不再请求。
+
+    Args:
+        fetch: 飞书接口，如`_fs.api.chat.get_members`，需要接受page_token参数
+        items_key: 响应中`data`下数据列表的键名
+        max_items: 最多返回的条数
+        prefetch: 是否预先请求下一页
+        **params: 传给fetch的其他参数
+
+    Example:
+        for member in paginate(_fs.api.chat.get_members, chat_id=chat_id, page_size=50):
+            ...
+    """
+    if max_items is not None and max_items <= 0:
+        return
+    count = 0
+
+    def is_last(data: dict) -> bool:
+        return max_items is not None and count + len(safe_get(data, items_key) or []) >= max_items
+
+    for data in paginate_pages(fetch, prefetch, is_last, **params):
+        for item in safe_get(data, items_key) or []:
+            yield item
+            count += 1
+            if max_items is not None and count >= max_items:
+                return
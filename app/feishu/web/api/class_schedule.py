@@ -30,9 +30,9 @@ def update_class_schedule():
 
 def get_courses_info(cookie):
     """从教务处获取课表信息"""
-    import requests
     import re
     from bs4 import BeautifulSoup
+    from app.ext.http_session import get_session
 
     # 目标 URL
     url = "http://bkjw.njust.edu.cn/njlgdx/xskb/xskb_list.do?Ves632DSdyV=NEW_XSD_PYGL"
@@ -48,7 +48,7 @@ def get_courses_info(cookie):
     }
 
     # 发送 GET 请求
-    response = requests.get(url, headers=headers, cookies=cookies)
+    response = get_session().get(url, headers=headers, cookies=cookies)
 
     # 解析 HTML
     soup = BeautifulSoup(response.text, "html.parser")
@@ -1,38 +1,147 @@
-import requests
 import logging
+import threading
+import time
+
+import redis
+
+from app.ext.http_session import DEFAULT_HTTP_CONFIG, get_session
 
 # const
 # 开放接口 URI
 TENANT_ACCESS_TOKEN_URI = "/open-apis/auth/v3/tenant_access_token/internal"
 JSAPI_TICKET_URI = "/open-apis/jssdk/ticket/get"
+# 在过期前多久开始刷新(秒)
+REFRESH_AHEAD = 300
+# 获取token/ticket的POST请求是幂等的，使用允许POST重试的session
+AUTH_SESSION = "feishu_auth"
+AUTH_RETRY_METHODS = [*DEFAULT_HTTP_CONFIG["retry_methods"], "POST"]
+
+
+def _auth_session():
+    return get_session(AUTH_SESSION, retry_methods=AUTH_RETRY_METHODS)
 
 
 class Auth(object):
-    def __init__(self, feishu_host, app_id, app_secret):
+    """
+    获取网页应用鉴权所需的tenant_access_token和jsapi_ticket
+
+    两者的有效期约为2小时，获取后连同过期时间缓存在进程内和redis(`feishu:auth:<app_id>:<name>`)中，
+    距离过期不足`refresh_ahead`秒时提前刷新。
+    刷新由进程内锁和redis锁保证同一时间只有一个请求访问开放接口，
+    其他请求在旧值仍有效时直接使用旧值，没有可用值时等待刷新结果。
+    """
+
+    def __init__(self, feishu_host, app_id, app_secret, redis_client: redis.Redis | None = None,
+                 refresh_ahead: int = REFRESH_AHEAD):
         self.feishu_host = feishu_host
         self.app_id = app_id
         self.app_secret = app_secret
+        self.redis_client = redis_client
+        self.refresh_ahead = refresh_ahead
         self.tenant_access_token = ""
+        # {name: (value, 过期时间戳)}
+        self._cache = {}
+        self._locks = {"tenant_access_token": threading.Lock(), "jsapi_ticket": threading.Lock()}
 
     def get_ticket(self):
         # 获取jsapi_ticket，具体参考文档：https://open.feishu.cn/document/ukTMukTMukTM/uYTM5UjL2ETO14iNxkTN/h5_js_sdk/authorization
+        return self._get_cached("jsapi_ticket", self._fetch_ticket)
+
+    def authorize_tenant_access_token(self):
+        # 获取tenant_access_token，基于开放平台能力实现，具体参考文档：https://open.feishu.cn/document/ukTMukTMukTM/ukDNz4SO0MjL5QzM/auth-v3/auth/tenant_access_token_internal
+        self.tenant_access_token = self._get_cached("tenant_access_token", self._fetch_tenant_access_token)
+
+    def _fetch_ticket(self):
         self.authorize_tenant_access_token()
         url = "{}{}".format(self.feishu_host, JSAPI_TICKET_URI)
         headers = {
             "Authorization": "Bearer " + self.tenant_access_token,
             "Content-Type": "application/json",
         }
-        resp = requests.post(url=url, headers=headers)
+        resp = _auth_session().post(url=url, headers=headers)
         Auth._check_error_response(resp)
-        return resp.json().get("data").get("ticket", "")
+        data = resp.json().get("data")
+        return data.get("ticket", ""), data.get("expire_in", 0)
 
-    def authorize_tenant_access_token(self):
-        # 获取tenant_access_token，基于开放平台能力实现，具体参考文档：https://open.feishu.cn/document/ukTMukTMukTM/ukDNz4SO0MjL5QzM/auth-v3/auth/tenant_access_token_internal
+    def _fetch_tenant_access_token(self):
         url = "{}{}".format(self.feishu_host, TENANT_ACCESS_TOKEN_URI)
         req_body = {"app_id": self.app_id, "app_secret": self.app_secret}
-        response = requests.post(url, req_body)
+        response = _auth_session().post(url, req_body)
         Auth._check_error_response(response)
-        self.tenant_access_token = response.json().get("tenant_access_token")
+        response_dict = response.json()
+        return response_dict.get("tenant_access_token"), response_dict.get("expire", 0)
+
+    def _get_cached(self, name, fetch):
+        """
+        获取缓存的值，即将过期时刷新
+
+        Args:
+            name: 缓存名
+            fetch: 访问开放接口的函数，返回(值, 有效期秒数)
+        """
+        value, expire_at = self._cache.get(name, (None, 0))
+        if value and time.time() < expire_at - self.refresh_ahead:
+            return value
+        # 其他进程可能已经刷新
+        value, expire_at = self._load_from_redis(name) or (value, expire_at)
+        if value and time.time() < expire_at - self.refresh_ahead:
+            self._cache[name] = (value, expire_at)
+            return value
+
+        still_valid = bool(value) and time.time() < expire_at
+        lock = self._locks[name]
+        # 旧值仍有效时不等待其他请求的刷新结果
+        if not lock.acquire(blocking=not still_valid):
+            return value
+        try:
+            cached = self._cache.get(name)
+            if cached and time.time() < cached[1] - self.refresh_ahead:
+                return cached[0]
+            redis_lock = self._get_redis_lock(name)
+            if redis_lock and not redis_lock.acquire(blocking=not still_valid):
+                if still_valid:
+                    return value
+                # 等待超时仍没有可用值，不再等待其他进程
+                redis_lock = None
+            try:
+                cached = self._load_from_redis(name)
+                if cached and time.time() < cached[1] - self.refresh_ahead:
+                    self._cache[name] = cached
+                    return cached[0]
+                value, expire = fetch()
+                expire_at = time.time() + expire
+                self._cache[name] = (value, expire_at)
+                if self.redis_client and expire > 0:
+                    self.redis_client.set(self._redis_key(name), value, ex=int(expire))
+                return value
+            finally:
+                if redis_lock:
+                    try:
+                        redis_lock.release()
+                    except redis.exceptions.LockError:
+                        pass
+        finally:
+            lock.release()
+
+    def _redis_key(self, name):
+        return f"feishu:auth:{self.app_id}:{name}"
+
+    def _load_from_redis(self, name):
+        """获取redis中的值和过期时间戳，不存在时返回None"""
+        if not self.redis_client:
+            return None
+        pipe = self.redis_client.pipeline()
+        pipe.get(self._redis_key(name))
+        pipe.ttl(self._redis_key(name))
+        value, ttl = pipe.execute()
+        if not value or ttl <= 0:
+            return None
+        return value.decode(), time.time() + ttl
+
+    def _get_redis_lock(self, name):
+        if not self.redis_client:
+            return None
+        return self.redis_client.lock(self._redis_key(name) + ":lock", timeout=30, blocking_timeout=10)
 
     @staticmethod
     def _check_error_response(resp):
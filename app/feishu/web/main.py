@@ -6,6 +6,7 @@ import os
 import requests
 from .auth import Auth
 from ..config import FEISHU_CONFIG as _fs
+from ..config import redis_client
 from flask import Blueprint
 from flask import request, jsonify, render_template
 
@@ -40,7 +41,8 @@ def auth_error_handler(ex):
 
 
 # 用获取的环境变量初始化Auth类，由APP ID和APP SECRET获取access token，进而获取jsapi_ticket
-auth = Auth(LARK_HOST, APP_ID, APP_SECRET)
+# token和ticket缓存在redis中，多个进程共用
+auth = Auth(LARK_HOST, APP_ID, APP_SECRET, redis_client)
 
 
 # 默认的主页路径
@@ -56,7 +58,7 @@ def get_home():
 def get_config_parameters():
     # 接入方前端传来的需要鉴权的网页url
     url = request.args.get("url")
-    # 初始化Auth类时获取的jsapi_ticket
+    # 缓存的jsapi_ticket，即将过期时自动刷新
     ticket = auth.get_ticket()
     # 当前时间戳，毫秒级
     timestamp = int(time.time()) * 1000
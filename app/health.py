@@ -0,0 +1,36 @@
+from flask import Blueprint, jsonify
+
+from app import app
+from app.ext.http_session import get_http_pool_stats
+from app.ext.redis import get_redis_pool_stats
+
+# 健康检查，不带前缀，供负载均衡/容器编排探测
+health_bp = Blueprint("health", __name__)
+
+
+@health_bp.route("/healthz", methods=["GET"])
+def healthz():
+    """存活检查：进程能处理请求即返回200"""
+    return jsonify({"status": "ok"})
+
+
+@health_bp.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    就绪检查：返回飞书初始化任务的状态和耗时
+
+    所有初始化任务执行成功前返回503，执行失败或超时的任务及其错误、耗时同样在jobs中返回
+    """
+    from app.feishu import get_startup_status
+    from app.feishu.config import FEISHU_CONFIG
+
+    status = get_startup_status()
+    pools = {}
+    if app.config.get("database"):
+        pools["mysql"] = app.config["database"].get_pool_stats()
+    if app.config.get("redis_client"):
+        pools["redis"] = get_redis_pool_stats(app.config["redis_client"])
+    pools["http"] = get_http_pool_stats()
+    status["pools"] = pools
+    status["feishu_api"] = FEISHU_CONFIG.api.get_stats()
+    return jsonify(status), 200 if status["ready"] else 503
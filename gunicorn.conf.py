@@ -0,0 +1,60 @@
+"""
+gunicorn 配置文件(生产环境)
+
+启动:       gunicorn -c gunicorn.conf.py wsgi:app
+平滑重启:   kill -HUP <master pid>     (重新加载配置并逐个替换worker)
+调整worker: kill -TTIN / -TTOU <master pid>
+
+参数优先级：环境变量(GUNICORN_<NAME>) > settings.json中的server项 > 默认值
+"""
+import multiprocessing
+import os
+import sys
+
+# 保证能从项目根目录导入app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scripts.utils import get_project_root, load_file
+
+_server_config = load_file(os.path.join(get_project_root(), "settings.json")).get("server", {})
+
+
+def _get(name, default):
+    """读取配置，类型与默认值保持一致"""
+    value = os.environ.get(f"GUNICORN_{name.upper()}", _server_config.get(name, default))
+    if isinstance(default, bool):
+        return value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes")
+    return type(default)(value)
+
+
+bind = _get("bind", "0.0.0.0:3000")
+# worker进程数，默认 2*CPU+1
+workers = _get("workers", multiprocessing.cpu_count() * 2 + 1)
+# gthread: 每个worker内的线程数; gevent: 每个worker的最大并发连接数
+worker_class = _get("worker_class", "gthread")
+threads = _get("threads", 4)
+worker_connections = _get("worker_connections", 1000)
+timeout = _get("timeout", 30)
+graceful_timeout = _get("graceful_timeout", 30)
+keepalive = _get("keepalive", 5)
+# 处理一定数量的请求后重启worker，避免内存泄漏;jitter避免所有worker同时重启
+max_requests = _get("max_requests", 1000)
+max_requests_jitter = _get("max_requests_jitter", 100)
+# master不导入应用，HUP平滑重启时新worker加载新代码；一次性初始化在worker启动后执行
+preload_app = False
+
+
+def post_worker_init(worker):
+    """
+    worker加载应用后执行一次性初始化
+
+    多个worker同时调用时，由redis锁选出一个worker执行(参考`StartupJobRegistry`)，
+    同一次部署内worker重启(max_requests、HUP)时不会重复执行；
+    飞书初始化任务在后台线程中执行，初始化进度通过/readyz查询(状态记录在redis中)
+    """
+    from app import app, run_startup_jobs
+    run_startup_jobs(app)
+
+
+def on_reload(server):
+    server.log.info("收到HUP，平滑重启worker(同一次部署内不重复执行一次性初始化)")
@@ -1,11 +1,28 @@
 import logging
+import os
+import threading
+import time
 import pymysql
 import re
+from contextlib import contextmanager
 from functools import wraps
 from dbutils.pooled_db import PooledDB
 
 logger = logging.getLogger(__name__)
 
+# 连接池默认参数
+DEFAULT_POOL_CONFIG = {
+    "maxconnections": 10,   # 连接池最大连接数
+    "mincached": 0,         # 初始化时，连接池中至少创建的空闲连接数(0:首次使用时才建立连接)
+    "maxcached": 5,         # 连接池中最多空闲连接数
+    "maxshared": 0,         # 连接池中最多共享连接数(pymysql线程安全等级为1，共享无意义)
+    "blocking": True,       # 连接池中如果没有可用连接后是否阻塞
+}
+
+# fork前创建的连接池，子进程中不能关闭(会向父进程正在使用的socket发送QUIT)，
+# 也不能被回收(PooledDB.__del__同样会关闭连接)，因此在这里保留引用
+_inherited_pools = []
+
 def _log_errors(func):
     """记录异常的装饰器."""
     @wraps(func)
@@ -18,32 +35,158 @@ def _log_errors(func):
     return wrapper
 
 class MySql:
-    """基于pymysql和Dbutils的Mysql连接池类."""
-    def __init__(self, host, port, user, password, default_db = None):
-        logger.info(f"Connecting to MySQL server at {host}:{port} with user {user}")
-        # 创建连接池
-        self.pool = PooledDB(
-            creator=pymysql,  # 使用 PyMySQL 连接
-            maxconnections=5,     # 连接池最大连接数
-            mincached=2,          # 初始化时，连接池中至少创建的空闲连接数
-            maxcached=5,          # 连接池中最多空闲连接数
-            maxshared=3,          # 连接池中最多共享连接数
-            blocking=True,        # 连接池中如果没有可用连接后是否阻塞
-            host=host, 
-            port=int(port), 
-            user=user, 
-            passwd=password, 
-            charset='utf8'
-        )
+    """
+    基于pymysql和Dbutils的Mysql连接池类.
+
+    连接池在每个进程首次使用时才创建，fork出的子进程(celery prefork、gunicorn worker)
+    会自动建立自己的连接池，不会与父进程共享socket
+    """
+    def __init__(self, host, port, user, password, default_db = None, pool_config: dict | None = None):
+        logger.info(f"Using MySQL server at {host}:{port} with user {user}")
+        self.pool_config = {**DEFAULT_POOL_CONFIG, **(pool_config or {})}
+        self._connect_kwargs = {
+            "host": host,
+            "port": int(port),
+            "user": user,
+            "passwd": password,
+            "charset": 'utf8'
+        }
         self.default_db = default_db
-    
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._write_listeners = []
+        self._write_batch = threading.local()
+        self._reset_stats()
+
+    @property
+    def pool(self) -> PooledDB:
+        """当前进程的连接池，不存在或是从父进程继承的则新建."""
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._discard_pool()
+                    self._pool = PooledDB(
+                        creator=pymysql,  # 使用 PyMySQL 连接
+                        **self.pool_config,
+                        **self._connect_kwargs
+                    )
+                    self._pool_pid = os.getpid()
+                    logger.info(f"Create MySQL pool in process {self._pool_pid}: {self.pool_config}")
+        return self._pool
+
+    def _discard_pool(self):
+        """丢弃当前的连接池，继承自父进程的连接池不关闭."""
+        if self._pool is not None:
+            if self._pool_pid == os.getpid():
+                self._pool.close()
+            else:
+                _inherited_pools.append(self._pool)
+        self._pool = None
+        self._pool_pid = None
+        self._reset_stats()
+
+    def reset_pool(self):
+        """
+        丢弃当前的连接池，下次使用时重新创建.
+
+        应在fork后的子进程中调用(`worker_process_init`、`post_fork`等)
+        """
+        # fork时锁可能正被父进程的其他线程持有，子进程中需要新建
+        self._pool_lock = threading.Lock()
+        self._discard_pool()
+
+    def close_pool(self):
+        """关闭当前进程的连接池(如在fork前由父进程调用)."""
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.close()
+        self._pool = None
+        self._pool_pid = None
+
+    def add_write_listener(self, listener):
+        """
+        注册写入回调，insert/update/delete提交后以被修改的表名集合调用listener(tables)
+
+        用于缓存失效等，回调中的异常只记录日志。`batch_writes`内的写入在代码块结束时合并为一次回调
+        """
+        self._write_listeners.append(listener)
+
+    @contextmanager
+    def batch_writes(self):
+        """
+        合并当前线程在代码块内的写入回调，结束时只调用一次listener
+
+        用于逐行写入大量数据(如从电子表格导入物资)，避免每行都触发一次缓存失效；可以嵌套使用
+        """
+        batch = self._write_batch
+        if getattr(batch, "tables", None) is not None:
+            yield
+            return
+        batch.tables = set()
+        try:
+            yield
+        finally:
+            tables, batch.tables = batch.tables, None
+            self._notify_write(*tables)
+
+    def _notify_write(self, *tables: str):
+        pending = getattr(self._write_batch, "tables", None)
+        if pending is not None:
+            pending.update(tables)
+            return
+        if not tables:
+            return
+        tables = set(tables)
+        for listener in self._write_listeners:
+            try:
+                listener(tables)
+            except Exception as e:
+                logger.error(f"Error in write listener for {tables}: {str(e)}")
+
+    def _reset_stats(self):
+        self._stats = {"checkouts": 0, "wait_time": 0.0, "max_wait_time": 0.0}
+
+    def get_pool_stats(self) -> dict:
+        """
+        获取当前进程的连接池统计数据
+
+        Return:
+            {
+                'pid': 进程id,
+                'checkouts': 取出连接的次数,
+                'wait_time': 等待连接的总耗时(秒),
+                'max_wait_time': 单次等待连接的最大耗时(秒),
+                'in_use': 正在使用的连接数,
+                'idle': 空闲连接数,
+                'maxconnections': 最大连接数
+            }
+        """
+        pool = self._pool if self._pool_pid == os.getpid() else None
+        return {
+            "pid": os.getpid(),
+            **self._stats,
+            "in_use": getattr(pool, "_connections", 0),
+            "idle": len(getattr(pool, "_idle_cache", ())),
+            "maxconnections": self.pool_config["maxconnections"],
+        }
+
     def set_default_db(self, db):
         """设置默认数据库."""
         self.default_db = db
         
+    def _checkout(self):
+        """从连接池中取出连接，并记录等待耗时."""
+        start = time.perf_counter()
+        conn = self.pool.connection()
+        wait_time = time.perf_counter() - start
+        self._stats["checkouts"] += 1
+        self._stats["wait_time"] += wait_time
+        self._stats["max_wait_time"] = max(self._stats["max_wait_time"], wait_time)
+        return conn
+
     def get_connection(self, db = None):
         """获取指定数据库的连接."""
-        conn = self.pool.connection()
+        conn = self._checkout()
         conn.cursor().execute(f"USE {db or self.default_db};")
         return conn
 
@@ -53,7 +196,7 @@ class MySql:
         创建数据库
         """
         sql = f"CREATE DATABASE IF NOT EXISTS `{database_name}`;"
-        with self.pool.connection().cursor() as cursor:
+        with self._checkout().cursor() as cursor:
             cursor.execute(sql)
 
     @_log_errors
@@ -71,7 +214,7 @@ class MySql:
         检查数据库是否已经存在
         """
         sql = "SHOW DATABASES LIKE %s;"
-        with self.pool.connection().cursor() as cursor:
+        with self._checkout().cursor() as cursor:
             cursor.execute(sql, (database_name,))
             result = cursor.fetchone()
             return result is not None
@@ -130,6 +273,46 @@ class MySql:
             cursor.execute(sql, (f"%{value}%",))
             return cursor.fetchall()
 
+    @_log_errors
+    def fetch_page(
+        self,
+        table: str,
+        key: str,
+        value: str | int,
+        after: int | None = None,
+        before: int | None = None,
+        limit: int = 20,
+        like: bool = False,
+        db: str = None
+    ) -> list:
+        """
+        按id分页获取多条数据(keyset分页，不使用OFFSET).
+
+        Args:
+            after: 只返回id大于after的数据(下一页)
+            before: 只返回id小于before的数据(上一页)，指定after时忽略
+            limit: 最多返回的数据条数
+            like: 是否模糊搜索
+
+        Return:
+            按id升序排列的数据
+        """
+        sql = f"SELECT SQL_NO_CACHE * FROM {table} WHERE {key} {'LIKE' if like else '='} %s"
+        params = [f"%{value}%" if like else value]
+        if after is not None:
+            sql += " AND id > %s ORDER BY id ASC LIMIT %s"
+            params += [after, limit]
+        elif before is not None:
+            sql += " AND id < %s ORDER BY id DESC LIMIT %s"
+            params += [before, limit]
+        else:
+            sql += " ORDER BY id ASC LIMIT %s"
+            params += [limit]
+        with self.get_connection(db).cursor() as cursor:
+            cursor.execute(sql, params)
+            result = cursor.fetchall()
+        return result[::-1] if after is None and before is not None else result
+
     @_log_errors
     def gettable(self, db: str = None) -> list:
         """获取当前数据库中的所有表."""
@@ -159,6 +342,7 @@ class MySql:
             with conn.cursor() as cursor:
                 cursor.execute(sql, values)
                 conn.commit()
+        self._notify_write(table)
 
     @_log_errors
     def update(self, table: str, key: tuple, updates: dict, db: str = None) -> None:
@@ -183,6 +367,7 @@ class MySql:
             with conn.cursor() as cursor:
                 cursor.execute(sql, values)
                 conn.commit()
+        self._notify_write(table)
 
     @_log_errors
     def delete(self, table: str, key: tuple = None, value=None, db: str = None) -> None:
@@ -203,6 +388,75 @@ class MySql:
                     sql = f"DELETE FROM {table}"
                     cursor.execute(sql)
                 conn.commit()
+        self._notify_write(table)
+
+    @contextmanager
+    def transaction(self, db: str = None):
+        """
+        在一个事务中执行多条语句，yield cursor；代码块中出现异常时回滚并抛出
+
+        不会触发写入回调，调用方需在提交后自行调用`_notify_write`
+        """
+        with self.get_connection(db) as conn:
+            try:
+                with conn.cursor() as cursor:
+                    yield cursor
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    @staticmethod
+    def _execute_batch(
+        cursor,
+        table: str,
+        key: str,
+        inserts: list[dict] | None = None,
+        updates: list[dict] | None = None,
+        deletes: list | None = None
+    ):
+        """用cursor执行批量插入、更新、删除，参数参考`apply_batch`"""
+        if inserts:
+            columns = list(inserts[0].keys())
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+            cursor.executemany(sql, [tuple(row[col] for col in columns) for row in inserts])
+        if updates:
+            columns = [col for col in updates[0].keys() if col != key]
+            set_clause = ', '.join(f"{col} = %s" for col in columns)
+            sql = f"UPDATE {table} SET {set_clause} WHERE {key} = %s"
+            cursor.executemany(sql, [tuple(row[col] for col in columns) + (row[key],) for row in updates])
+        if deletes:
+            sql = f"DELETE FROM {table} WHERE {key} IN ({', '.join(['%s'] * len(deletes))})"
+            cursor.execute(sql, tuple(deletes))
+
+    @_log_errors
+    def apply_batch(
+        self,
+        table: str,
+        key: str,
+        inserts: list[dict] | None = None,
+        updates: list[dict] | None = None,
+        deletes: list | None = None,
+        db: str = None
+    ) -> bool:
+        """
+        在一个事务中批量插入、更新、删除数据.
+
+        Args:
+            table: 表名
+            key: 更新、删除时用于查找记录的列
+            inserts: 插入的数据，每条数据的字段需相同
+            updates: 更新的数据，每条数据需包含key列，其余字段需相同
+            deletes: 删除的记录的key列的值
+
+        Return:
+            成功时返回True，失败时回滚并返回None
+        """
+        with self.transaction(db) as cursor:
+            self._execute_batch(cursor, table, key, inserts, updates, deletes)
+        if inserts or updates or deletes:
+            self._notify_write(table)
+        return True
 
     @_log_errors
     def getchecksum(self, table: str, db: str = None) -> list:
@@ -214,8 +468,8 @@ class MySql:
 
     def __del__(self):
         """清理连接池."""
-        if hasattr(self, 'pool'):
-            self.pool.close()
+        if getattr(self, '_pool', None) is not None and self._pool_pid == os.getpid():
+            self._pool.close()
 
 class SQLException(Exception):
     """自定义异常."""
@@ -0,0 +1,256 @@
+"""
+消息卡片渲染性能测试
+
+使用合成的物资数据(不连接mysql/redis)测试各页面(title 0~4)的渲染耗时、内存分配和卡片大小，
+以及`replace_placeholders`、`Template`、`format_with_margin`等热点函数。
+
+在项目根目录下运行:
+    python -m scripts.benchmark_card
+    python -m scripts.benchmark_card --sizes 10,1000 --iterations 20 --json result.json
+    python -m scripts.benchmark_card --max-p99-ms 50   # p99超过50ms时返回非0，可用于部署前检查
+"""
+import argparse
+import bisect
+import copy
+import gc
+import statistics
+import sys
+import time
+import tracemalloc
+
+import ujson
+
+from app.ext.cache import VersionedCache
+from scripts.utils import compile_template, format_column, format_with_margin, replace_placeholders
+
+BENCH_USER_ID = "bench_user"
+BENCH_USER_NAME = "测试用户"
+UNITS_PER_NAME = 20
+NAMES_PER_CATEGORY = 100
+
+
+class SyntheticDatabase:
+    """
+    实现卡片渲染用到的`app.ext.database.Database`查询接口的内存数据库
+
+    每个物品名下UNITS_PER_NAME个物品，每个类型下NAMES_PER_CATEGORY个物品名，
+    每10个物品中有1个由BENCH_USER_ID持有
+    """
+    useable_map = {1: '可用', 0: '已借出', 2: '维修中', 3: '报废', 4: '申请中', 5: '未知'}
+
+    def __init__(self, num_items: int):
+        self.categories = []    # (id, name, total)
+        self.lists = []         # (id, father, name, total, free)
+        self.items = []         # (id, father, useable, wis, do)
+        names = max(1, -(-num_items // UNITS_PER_NAME))
+        for n in range(names):
+            category_id = n // NAMES_PER_CATEGORY + 1
+            name_id = category_id * 1000 + n % NAMES_PER_CATEGORY + 1
+            if not self.categories or self.categories[-1][0] != category_id:
+                self.categories.append([category_id, f"类型{category_id}", 0])
+            units = min(UNITS_PER_NAME, num_items - n * UNITS_PER_NAME)
+            for u in range(units):
+                held = (len(self.items) % 10 == 0)
+                self.items.append((name_id * 1000 + u + 1, name_id, 0 if held else 1,
+                                   BENCH_USER_NAME if held else '仓库', '无'))
+            self.lists.append((name_id, category_id, f"物品{n}号", units, units))
+            self.categories[-1][2] += units
+        self.list_ids = [it[0] for it in self.lists]
+        self.item_ids = [it[0] for it in self.items]
+
+    def add_write_listener(self, listener):
+        pass
+
+    @staticmethod
+    def _page(rows, ids, after, before, limit):
+        if after is not None:
+            start = bisect.bisect_right(ids, after)
+            info = rows[start:start + limit + 1]
+            return info[:limit], len(info) > limit
+        if before is not None:
+            end = bisect.bisect_left(ids, before)
+            info = rows[max(0, end - limit - 1):end]
+            return info[-limit:], len(info) > limit
+        return rows[:limit], len(rows) > limit
+
+    def _list_dict(self, info):
+        return {'id': [it[0] for it in info], 'father': [it[1] for it in info],
+                'name': [it[2] for it in info], 'total': [it[3] for it in info],
+                'free': [it[4] for it in info]}
+
+    def _items_dict(self, info):
+        names = {it[0]: it[2] for it in self.lists}
+        return {'name': [names[it[1]] for it in info], 'id': [it[0] for it in info],
+                'father': [it[1] for it in info],
+                'useable': [self.useable_map[it[2]] for it in info],
+                'wis': [it[3] for it in info], 'do': [it[4] for it in info]}
+
+    def get_categories(self):
+        return {'id': [c[0] for c in self.categories], 'name': [c[1] for c in self.categories],
+                'total': [c[2] for c in self.categories]}
+
+    def get_list(self, category_id=None, category_name=None, name=None, name_id=None):
+        if category_id:
+            info = [it for it in self.lists if it[1] == int(category_id)]
+        elif name:
+            info = [it for it in self.lists if name in it[2]]
+        else:
+            info = [it for it in self.lists if it[0] == int(name_id)]
+        if not info:
+            raise ValueError("无法找到目标物品")
+        return self._list_dict(info)
+
+    def get_list_page(self, category_id=None, name=None, after=None, before=None, limit=20):
+        rows = [it for it in self.lists if (it[1] == int(category_id) if category_id else name in it[2])]
+        info, has_more = self._page(rows, [it[0] for it in rows], after, before, limit)
+        if not info:
+            raise ValueError("无法找到目标物品")
+        return {**self._list_dict(info), 'has_more': has_more}
+
+    def get_item(self, oid):
+        index = bisect.bisect_left(self.item_ids, int(oid))
+        if index == len(self.items) or self.items[index][0] != int(oid):
+            raise ValueError(f"无法找到目标物品 oid:{oid}")
+        return self._items_dict([self.items[index]])
+
+    def get_items(self, name_id=None, name=None, user_id=None, user_name=None):
+        if user_id:
+            info = [it for it in self.items if it[3] == BENCH_USER_NAME]
+        else:
+            info = [it for it in self.items if it[1] == int(name_id)]
+        return self._items_dict(info) if info else None
+
+    def get_items_page(self, name_id, after=None, before=None, limit=20):
+        start = bisect.bisect_left(self.item_ids, int(name_id) * 1000)
+        end = bisect.bisect_left(self.item_ids, (int(name_id) + 1) * 1000)
+        rows = self.items[start:end]
+        info, has_more = self._page(rows, self.item_ids[start:end], after, before, limit)
+        return {**self._items_dict(info), 'has_more': has_more} if info else None
+
+
+def measure(func, iterations: int, setup=None) -> dict:
+    """
+    多次执行func并统计
+
+    Return:
+        {'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'peak_kb', 'blocks', 'bytes'}
+        peak_kb/blocks为单次执行的内存峰值和执行结束时仍存活的内存块数(tracemalloc)，
+        bytes为返回值序列化成JSON后的字节数
+    """
+    timings = []
+    result = None
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.clear_traces()
+    kept = func()
+    _, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    del kept
+
+    timings.sort()
+    quantiles = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    return {
+        'p50_ms': round(quantiles[49], 3),
+        'p90_ms': round(quantiles[89], 3),
+        'p99_ms': round(quantiles[98], 3),
+        'max_ms': round(timings[-1], 3),
+        'peak_kb': round(peak / 1024, 1),
+        'blocks': blocks,
+        'bytes': len(ujson.dumps(result, ensure_ascii=False).encode()) if result is not None else 0,
+    }
+
+
+def bench_cards(application, size: int, iterations: int, titles: list[str]) -> list[dict]:
+    """对一个规模的合成数据，分别测试各页面未命中缓存和命中缓存时的渲染"""
+    database = SyntheticDatabase(size)
+    application.database = database
+    application.card_cache = VersionedCache(None, "benchmark", maxsize=1024)
+    first_name_id = database.lists[0][0]
+    title_args = {
+        '0': {'object_id': -1, 'user_id': BENCH_USER_ID},
+        '1': {'object_id': 0},
+        '2': {'object_id': database.categories[0][0]},
+        '3': {'object_id': first_name_id},
+        '4': {'object_id': -2, 'target': '物品'},
+    }
+    results = []
+    for title_id in titles:
+        kwargs = title_args[title_id]
+        render = lambda: application.create_message_card_date(**kwargs)
+        for mode, setup in (('cold', application.card_cache.invalidate), ('warm', None)):
+            if mode == 'warm':
+                render()
+            results.append({'size': size, 'title': title_id, 'mode': mode,
+                            **measure(render, iterations, setup)})
+    return results
+
+
+def bench_helpers(iterations: int) -> list[dict]:
+    """测试模板替换和宽度格式化"""
+    card = {'elements': [{'tag': 'markdown', 'content': '${name} oid:${oid}', 'value': {'id': '${oid}'}}
+                         for _ in range(50)]}
+    values = {'name': '大装甲板', 'oid': 1001001}
+    template = compile_template(card)
+    cells = [f"物品{i}号" for i in range(100)]
+    cases = {
+        'replace_placeholders(50 elements)': lambda: replace_placeholders(copy.deepcopy(card), values),
+        'Template.render(50 elements)': lambda: template.render(values),
+        'format_with_margin x100': lambda: [format_with_margin(c, 12) for c in cells],
+        'format_column(100 cells)': lambda: format_column(cells, 12),
+    }
+    return [{'case': name, **measure(func, iterations)} for name, func in cases.items()]
+
+
+def print_table(rows: list[dict], columns: list[str]):
+    widths = [max(len(col), *(len(str(row[col])) for row in rows)) for col in columns]
+    print("  ".join(col.ljust(w) for col, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[col]).ljust(w) for col, w in zip(columns, widths)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="消息卡片渲染性能测试")
+    parser.add_argument('--sizes', default='10,1000,50000', help="合成数据的物品数量，逗号分隔")
+    parser.add_argument('--titles', default='0,1,2,3,4', help="测试的页面，逗号分隔")
+    parser.add_argument('--iterations', type=int, default=50, help="每项测试的执行次数")
+    parser.add_argument('--json', help="将结果写入json文件")
+    parser.add_argument('--max-p99-ms', type=float, help="任一卡片测试的p99超过该值时返回1")
+    args = parser.parse_args(argv)
+
+    from app.feishu.commands import application
+
+    card_results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        card_results += bench_cards(application, size, args.iterations, args.titles.split(','))
+    helper_results = bench_helpers(args.iterations)
+
+    print_table(card_results, ['size', 'title', 'mode', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms',
+                               'peak_kb', 'blocks', 'bytes'])
+    print()
+    print_table(helper_results, ['case', 'p50_ms', 'p90_ms', 'p99_ms', 'peak_kb', 'blocks'])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            ujson.dump({'cards': card_results, 'helpers': helper_results}, f, indent=2, ensure_ascii=False)
+
+    if args.max_p99_ms is not None:
+        slow = [r for r in card_results if r['p99_ms'] > args.max_p99_ms]
+        for r in slow:
+            print(f"p99超出限制: size={r['size']} title={r['title']} mode={r['mode']} p99={r['p99_ms']}ms",
+                  file=sys.stderr)
+        return 1 if slow else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
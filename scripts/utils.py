@@ -1,6 +1,9 @@
+import re
 import ujson
 import sys
 import os
+import unicodedata
+from functools import lru_cache
 
 """
 该文件存储了一些工具类函数
@@ -18,11 +21,116 @@ class Obj(dict):
                 setattr(self, a, Obj(b) if isinstance(b, dict) else b)
 
 
+class ObjView:
+    """
+    字典的属性访问视图，用于替代`Obj`
+
+    不会在创建时递归转换整个字典，访问到嵌套的dict/list时才包装，并缓存包装结果；
+    `obj_2_dict`直接返回原字典，不会复制。
+    对视图设置属性只保存在视图上，不会修改原字典。
+    """
+
+    __slots__ = ("_data", "_attrs")
+
+    def __init__(self, data: dict):
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_attrs", {})
+
+    def __getattr__(self, name):
+        attrs = self._attrs
+        if name in attrs:
+            return attrs[name]
+        try:
+            value = self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        if isinstance(value, (dict, list)):
+            value = attrs[name] = _wrap(value)
+        return value
+
+    def __setattr__(self, name, value):
+        self._attrs[name] = value
+
+    def __getitem__(self, key):
+        return self.__getattr__(key)
+
+    def __contains__(self, key):
+        return key in self._attrs or key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"ObjView({self._data!r})"
+
+    @property
+    def __dict__(self):
+        # 兼容 obj.__dict__ 的写法
+        return self._data
+
+    def get(self, key, default=None):
+        try:
+            return self.__getattr__(key)
+        except AttributeError:
+            return default
+
+
+class ListView(list):
+    """
+    列表的视图，访问元素时才包装其中的dict/list，参考`ObjView`
+
+    是`list`的子类，保存原始元素(只复制引用，不递归转换)：序列化、拼接、`in`/`index`/`count`等操作使用原始元素，
+    下标访问和迭代时才返回包装后的元素，切片返回新的视图
+    """
+
+    __slots__ = ("_wrapped",)
+
+    def __init__(self, data: list):
+        super().__init__(data)
+        # {下标: (原始元素, 包装结果)}，元素被替换后重新包装
+        self._wrapped = {}
+
+    def _wrap_item(self, index, value):
+        if not isinstance(value, (dict, list)):
+            return value
+        cached = self._wrapped.get(index)
+        if cached is None or cached[0] is not value:
+            cached = self._wrapped[index] = (value, _wrap(value))
+        return cached[1]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ListView(super().__getitem__(index))
+        value = super().__getitem__(index)
+        if isinstance(value, (dict, list)):
+            return self._wrap_item(index % len(self), value)
+        return value
+
+    def __iter__(self):
+        for index, value in enumerate(super().__iter__()):
+            yield self._wrap_item(index, value)
+
+    def __repr__(self):
+        return f"ListView({super().__repr__()})"
+
+
+def _wrap(value):
+    return ObjView(value) if isinstance(value, dict) else ListView(value)
+
+
 def dict_2_obj(d: dict):
-    return Obj(d)
+    """将字典转换成可以用属性访问的对象(惰性包装，不复制)"""
+    return ObjView(d)
 
 
-def obj_2_dict(o: Obj) -> dict:
+def obj_2_dict(o: Obj | ObjView) -> dict:
+    if isinstance(o, ObjView):
+        return o._data
+    if isinstance(o, ListView):
+        return list.copy(o)
     r = {}
     for a, b in o.__dict__.items():
         if isinstance(b, str):
@@ -43,21 +151,66 @@ def DEBUG_OUT(data=None, json=None, file="request.json"):
         f.write(json_str)
 
 
+# 每个字符的显示宽度(0/1/2)，首次遇到时根据unicode的East Asian Width计算
+_CHAR_WIDTH = {}
+
+
+def _char_width(char):
+    width = _CHAR_WIDTH.get(char)
+    if width is None:
+        if unicodedata.combining(char) or unicodedata.category(char) in ("Mn", "Me", "Cf"):
+            width = 0  # 组合字符、零宽字符(变体选择符、ZWJ等)
+        elif "\U0001F3FB" <= char <= "\U0001F3FF":
+            width = 0  # emoji肤色修饰符，与前一个emoji显示为一个字符
+        elif unicodedata.east_asian_width(char) in ("W", "F"):
+            width = 2  # 中文字符、全角字符、emoji
+        elif unicodedata.east_asian_width(char) == "A" and ord(char) > 255:
+            width = 2  # 歧义宽度字符(如'—'、'·')在中文环境下按全角显示
+        else:
+            width = 1
+        _CHAR_WIDTH[char] = width
+    return width
+
+
 def get_display_width(s):
-    """计算字符串的显示宽度，中文字符占2个单位，英文字符、数字和全角空格占1个单位"""
+    """
+    计算字符串的显示宽度
+
+    Return:
+        (全角字符数, 半角字符数)，全角字符占2个单位，半角字符占1个单位，零宽字符不计
+    """
+    if s.isascii():
+        return 0, len(s)
     full_width = 0
     half_width = 0
+    after_zwj = False
+    prev_width = 0
     for char in s:
-        if ord(char) > 255 or char == "\u3000":  # 中文字符and全角空格
+        width = _CHAR_WIDTH.get(char)
+        if width is None:
+            width = _char_width(char)
+        if after_zwj:
+            width = 0  # ZWJ连接的emoji序列(如👨‍👩‍👧)显示为一个字符
+        elif char == "\ufe0f" and prev_width == 1:
+            # 变体选择符VS16使前一个字符(如'❤')以emoji显示，占全角宽度
+            half_width -= 1
             full_width += 1
-        else:  # 英文字符和数字
+        after_zwj = char == "\u200d"
+        prev_width = width
+        if width == 2:
+            full_width += 1
+        elif width == 1:
             half_width += 1
     return full_width, half_width
 
 
 def format_with_margin(s, margin, assign_full_width_num=None):
     """根据给定的宽度格式化字符串"""
-    s = str(s)
+    return _format_cell(str(s), margin, assign_full_width_num)
+
+
+@lru_cache(maxsize=4096)
+def _format_cell(s, margin, assign_full_width_num=None):
     full_width, half_width = get_display_width(s)
     if full_width * 2 + half_width >= margin:
         return s  # 如果字符串已经超过了margin，返回原字符串
@@ -80,6 +233,11 @@ def format_with_margin(s, margin, assign_full_width_num=None):
     return s + "\u3000" * full_width_num + "\u2007" * half_width_num
 
 
+def format_column(values, margin, assign_full_width_num=None):
+    """按相同的宽度格式化一列字符串，参考`format_with_margin`"""
+    return [_format_cell(str(s), margin, assign_full_width_num) for s in values]
+
+
 def is_valid(sstr, errors):
     """判断字符串是否合法"""
     voidc = ["'", '"', "\\", "<", ">", "(", ")", ".", "="]
@@ -97,9 +255,15 @@ def can_convert_to_int(a):
         return False
 
 
+# ${name} 格式的占位符
+_PLACEHOLDER_PATTERN = re.compile(r"\$\{(\w+)\}")
+
+
 def replace_placeholders(data, values):
     """
     格式化字典中 ${name} 格式的字符串
+
+    会直接修改传入的data，需要反复使用同一份模板时，应使用`Template`
     """
     if isinstance(data, dict):
         for key, value in data.items():
@@ -107,12 +271,65 @@ def replace_placeholders(data, values):
     elif isinstance(data, list):
         for index in range(len(data)):
             data[index] = replace_placeholders(data[index], values)
-    elif isinstance(data, str):
-        for key, value in values.items():
-            data = data.replace(f"${{{key}}}", str(value))
+    elif isinstance(data, str) and "${" in data:
+        data = _PLACEHOLDER_PATTERN.sub(
+            lambda m: str(values[m.group(1)]) if m.group(1) in values else m.group(0), data)
     return data
 
 
+class Template:
+    """
+    预编译的 ${name} 占位符模板
+
+    编译时记录每个占位符所在的字符串，并拆分成常量和占位符片段；
+    渲染时按片段直接拼接，并生成一份新的对象树(调用方可以随意修改)，
+    不需要先深拷贝模板，也不需要对每个字符串逐个key尝试 str.replace。
+    values中不存在的占位符保持原样，与`replace_placeholders`一致。
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.placeholders = set()
+        self._render = self._compile(data)
+
+    def render(self, values: dict | None = None):
+        """用values填充占位符，返回新的对象树"""
+        return self._render(values or {})
+
+    def _compile(self, node):
+        if isinstance(node, dict):
+            items = [(key, self._compile(value)) for key, value in node.items()]
+            return lambda values: {key: render(values) for key, render in items}
+        if isinstance(node, list):
+            renders = [self._compile(value) for value in node]
+            return lambda values: [render(values) for render in renders]
+        if isinstance(node, str):
+            parts = _PLACEHOLDER_PATTERN.split(node)
+            if len(parts) == 1:
+                return lambda values: node
+            # parts: [常量, 占位符名, 常量, 占位符名, ..., 常量]
+            self.placeholders.update(parts[1::2])
+            if len(parts) == 3 and not parts[0] and not parts[2]:
+                name = parts[1]
+                return lambda values: str(values[name]) if name in values else node
+            segments = [(parts[i], parts[i + 1]) for i in range(1, len(parts), 2)]
+            head = parts[0]
+
+            def render_str(values):
+                out = [head]
+                for name, literal in segments:
+                    out.append(str(values[name]) if name in values else f"${{{name}}}")
+                    out.append(literal)
+                return "".join(out)
+            return render_str
+        return lambda values: node
+
+
+def compile_template(data) -> Template:
+    """将含有 ${name} 占位符的字典/列表编译成模板"""
+    return Template(data)
+
+
 def load_file(file_path):
     try:
         with open(file_path, "r", encoding="utf-8") as f:
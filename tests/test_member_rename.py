@@ -0,0 +1,138 @@
+"""
+用户改名后，其持有的物品(`item_info.wis`记录用户名)仍能被找到和归还
+
+使用sqlite代替mysql，只转换本测试用到的语法(`%s`占位符、`SQL_NO_CACHE`)
+"""
+import sqlite3
+
+import pytest
+
+from app.ext.database import Database
+
+HOLDER = {'user_id': 'u1', 'open_id': 'ou_1', 'union_id': 'on_1', 'name': '张三'}
+OTHER = {'user_id': 'u2', 'open_id': 'ou_2', 'union_id': 'on_2', 'name': '李四'}
+OID = 1001001
+
+
+class _Cursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @staticmethod
+    def _sql(sql):
+        return sql.replace('SQL_NO_CACHE ', '').replace('%s', '?')
+
+    def execute(self, sql, args=()):
+        return self._cursor.execute(self._sql(sql), tuple(args or ()))
+
+    def executemany(self, sql, rows):
+        return self._cursor.executemany(self._sql(sql), rows)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Connection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _Cursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class SqliteDatabase(Database):
+    def __init__(self):
+        super().__init__({'host': 'localhost', 'port': 3306, 'user': 'test', 'password': '', 'db': 'test'})
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, time TEXT, userId TEXT,
+                               operation TEXT, object INTEGER, do TEXT);
+            CREATE TABLE item_list (id INTEGER PRIMARY KEY, father INTEGER, name TEXT,
+                                    total INTEGER DEFAULT 0, free INTEGER DEFAULT 0, broken INTEGER DEFAULT 0);
+            CREATE TABLE item_info (id INTEGER PRIMARY KEY, father INTEGER, useable INTEGER DEFAULT 1,
+                                    wis TEXT, do TEXT, purpose TEXT);
+            CREATE TABLE members (user_id TEXT, open_id TEXT, union_id TEXT, name TEXT NOT NULL,
+                                  root INTEGER DEFAULT 0, card_message_id TEXT, card_message_create_time TEXT);
+        """)
+
+    def get_connection(self, db=None):
+        return _Connection(self.conn)
+
+
+@pytest.fixture
+def database():
+    db = SqliteDatabase()
+    db.conn.execute("INSERT INTO item_list (id, father, name) VALUES (1001, 1, '电机')")
+    db.conn.execute("INSERT INTO item_info (id, father, useable, wis, do) VALUES (?, 1001, 0, ?, '无')",
+                    (OID, HOLDER['name']))
+    for member in (HOLDER, OTHER):
+        db.conn.execute("INSERT INTO members (user_id, open_id, union_id, name) VALUES (?, ?, ?, ?)",
+                        (member['user_id'], member['open_id'], member['union_id'], member['name']))
+    db.conn.commit()
+    return db
+
+
+def _holder_of(database, oid):
+    return database.get_item(oid)['wis'][0]
+
+
+def test_sync_members_rename_keeps_held_items(database):
+    renamed = {**HOLDER, 'name': '张三丰'}
+    assert database.sync_members([], [renamed], [])
+
+    assert _holder_of(database, OID) == '张三丰'
+    assert database.get_items(user_id='u1')['id'] == [OID]
+    assert database.return_item('u1', OID).startswith('你归还了物品')
+    assert _holder_of(database, OID) == '仓库'
+
+
+def test_sync_members_swapped_names(database):
+    assert database.sync_members([], [{**HOLDER, 'name': OTHER['name']}, {**OTHER, 'name': HOLDER['name']}], [])
+
+    assert _holder_of(database, OID) == OTHER['name']
+    assert database.return_item('u1', OID).startswith('你归还了物品')
+
+
+def test_sync_members_without_rename_leaves_items(database):
+    calls = []
+    database.add_write_listener(calls.append)
+    assert database.sync_members([], [{**HOLDER, 'open_id': 'ou_new'}], [])
+
+    assert _holder_of(database, OID) == HOLDER['name']
+    assert calls == [{'members'}]
+
+
+def test_upsert_member_rename_keeps_held_items(database):
+    assert database.upsert_member({**HOLDER, 'name': '张三丰'})
+
+    assert _holder_of(database, OID) == '张三丰'
+    assert database.return_item('u1', OID).startswith('你归还了物品')
+
+
+def test_upsert_member_inserts_new_member(database):
+    new = {'user_id': 'u3', 'open_id': 'ou_3', 'union_id': 'on_3', 'name': '王五'}
+    assert database.upsert_member(new)
+
+    assert database.get_member('u3')['name'] == '王五'
+    assert _holder_of(database, OID) == HOLDER['name']
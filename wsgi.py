@@ -0,0 +1,12 @@
+"""
+生产环境 WSGI 入口
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+一次性初始化在 worker 加载应用后执行(参考gunicorn.conf.py)，这里只注册蓝图
+"""
+from app import create_app
+from app.ext.logger import init_logging
+
+init_logging()
+app = create_app()